@@ -6,5 +6,13 @@ ep = select.epoll()
 ep.register(0, select.EPOLLIN, (lambda x:x, (0,)))
 res = ep.poll(2000)
 print(res)
-for ev, fd in res:
-    print(os.read(fd, 256))
+for cb, ev in res:
+    print(os.read(cb[1][0], 256))
+
+# Edge-triggered, one-shot registration, with allocation-free iteration
+# over results.
+ep.register(0, select.EPOLLIN | select.EPOLLET | select.EPOLLONESHOT)
+for fd, ev in ep.ipoll(2000):
+    print(fd, ev, os.read(fd, 256))
+# Re-arm one-shot registration
+ep.modify(0, select.EPOLLIN | select.EPOLLET | select.EPOLLONESHOT)
@@ -1,5 +1,7 @@
 import ffi
 import ustruct as struct
+import uctypes
+import uos
 import os
 import errno
 import ffilib
@@ -33,52 +35,73 @@ EPOLL_CTL_MOD = 3
 # Not included in uselect.
 POLLPRI = 0x002
 
-# TODO: struct epoll_event's 2nd member is union of uint64_t, etc.
-# On x86, uint64_t is 4-byte aligned, on many other platforms - 8-byte.
-# Until uctypes module can assign native struct offset, use dirty hack
-# below.
-# TODO: Get rid of all this dirtiness, move it on C side
+# struct epoll_event's 2nd member is union of uint64_t, etc. On x86_64,
+# epoll_event is packed struct. On x86, uint64_t is 4-byte aligned, on
+# many other platforms - 8-byte, so native layout of "IQ" matches.
+# Data member holds fd, which is mapped to user-level retval using
+# registry.
 if ffilib.bitness > 32:
-    # On x86_64, epoll_event is packed struct
-    epoll_event = "<IO"
-elif struct.calcsize("IQ") == 12:
-    epoll_event = "IO"
+    epoll_event = "<IQ"
 else:
-    epoll_event = "QO"
+    epoll_event = "IQ"
+EV_SIZE = struct.calcsize(epoll_event)
+# Indexes of events and of low 32 bits of data in epoll_event, in 32-bit
+# words.
+EV_WORDS = EV_SIZE // 4
+if struct.pack("I", 1)[0] == 1:
+    EV_FD = EV_WORDS - 2
+else:
+    EV_FD = EV_WORDS - 1
+
 
 class Epoll:
 
-    def __init__(self, epfd):
+    def __init__(self, epfd, maxevents=64):
         self.epfd = epfd
-        self.evbuf = struct.pack(epoll_event, 0, None)
+        self.maxevents = maxevents
+        # Preallocated buffer for results of epoll_wait(), accessed as
+        # array of 32-bit words, to read events without allocation.
+        self.evbuf = bytearray(EV_SIZE * maxevents)
+        self.evwords = uctypes.struct(uctypes.addressof(self.evbuf), {
+            "w": (uctypes.ARRAY | 0, uctypes.UINT32 | (EV_WORDS * maxevents))
+        }, uctypes.NATIVE).w
         self.registry = {}
+        # State of ipoll() iteration
+        self.n = 0
+        self.i = 0
+        self.res = [None, 0]
+
+    def _ctl(self, op, fd, eventmask):
+        s = struct.pack(epoll_event, eventmask, fd)
+        return epoll_ctl(self.epfd, op, fd, s)
 
     def register(self, fd, eventmask=EPOLLIN|EPOLLPRI|EPOLLOUT, retval=None):
         "retval is extension to stdlib, value to use in results from .poll()."
         if retval is None:
             retval = fd
-        s = struct.pack(epoll_event, eventmask, retval)
-        r = epoll_ctl(self.epfd, EPOLL_CTL_ADD, fd, s)
-        if r == -1 and os.errno_() == errno.EEXIST:
-            r = epoll_ctl(self.epfd, EPOLL_CTL_MOD, fd, s)
+        r = self._ctl(EPOLL_CTL_ADD, fd, eventmask)
+        if r == -1 and uos.errno() == errno.EEXIST:
+            r = self._ctl(EPOLL_CTL_MOD, fd, eventmask)
         os.check_error(r)
-        # We must keep reference to retval, or it may be GCed. And we must
-        # keep mapping from fd to retval to be able to get rid of this retval
-        # reference later.
+        # We must keep mapping from fd to retval to be able to return it
+        # from .poll().
         self.registry[fd] = retval
 
+    def modify(self, fd, eventmask):
+        # Also used to re-arm fd registered with EPOLLONESHOT
+        os.check_error(self._ctl(EPOLL_CTL_MOD, fd, eventmask))
+
     def unregister(self, fd):
         # Pass dummy event structure, to workaround kernel bug
         r = epoll_ctl(self.epfd, EPOLL_CTL_DEL, fd, self.evbuf)
         os.check_error(r)
         del self.registry[fd]
 
-    def poll_ms(self, timeout=-1):
-        s = bytearray(self.evbuf)
+    def _wait(self, timeout):
         if timeout >= 0:
             deadline = utime.ticks_add(utime.ticks_ms(), timeout)
         while True:
-            n = epoll_wait(self.epfd, s, 1, timeout)
+            n = epoll_wait(self.epfd, self.evbuf, self.maxevents, timeout)
             if not os.check_error(n):
                 break
             if timeout >= 0:
@@ -86,20 +109,57 @@ class Epoll:
                 if timeout < 0:
                     n = 0
                     break
+        return n
+
+    def poll_ms(self, timeout=-1):
+        n = self._wait(timeout)
+        w = self.evwords
         res = []
-        if n > 0:
-            vals = struct.unpack(epoll_event, s)
-            res.append((vals[1], vals[0]))
+        for i in range(0, n * EV_WORDS, EV_WORDS):
+            fd = w[i + EV_FD]
+            if fd in self.registry:
+                res.append((self.registry[fd], w[i]))
         return res
 
     def poll(self, timeout=-1):
         return self.poll_ms(-1 if timeout == -1 else math.ceil(timeout * 1000))
 
+    def ipoll(self, timeout=-1):
+        # Like uselect.poll.ipoll(), timeout is in ms, and returned
+        # iterator yields the same [retval, eventmask] list object for
+        # each event, updated in place, so its content must be consumed
+        # (or copied) before getting the next event.
+        self.n = self._wait(timeout) * EV_WORDS
+        self.i = 0
+        return self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        w = self.evwords
+        while self.i < self.n:
+            i = self.i
+            self.i = i + EV_WORDS
+            fd = w[i + EV_FD]
+            # Skip events for fd's unregistered after epoll_wait()
+            if fd in self.registry:
+                res = self.res
+                res[0] = self.registry[fd]
+                res[1] = w[i]
+                return res
+        _stop_iter.__traceback__ = None
+        raise _stop_iter
+
     def close(self):
         os.close(self.epfd)
 
 
-def epoll(sizehint=4):
+_stop_iter = StopIteration()
+
+
+def epoll(sizehint=4, maxevents=64):
+    "maxevents is extension to stdlib, max number of events returned per poll."
     fd = epoll_create(sizehint)
     os.check_error(fd)
-    return Epoll(fd)
+    return Epoll(fd, maxevents)
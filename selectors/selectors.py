@@ -0,0 +1,208 @@
+from ucollections import namedtuple
+import math
+import uselect
+
+try:
+    # micropython-lib's ffi-based select module, unix port only
+    import select
+    _epoll = select.epoll
+except (ImportError, AttributeError):
+    _epoll = None
+
+
+EVENT_READ = 1
+EVENT_WRITE = 2
+
+SelectorKey = namedtuple("SelectorKey", ["fileobj", "fd", "events", "data"])
+
+
+def _fileobj_to_fd(fileobj):
+    if isinstance(fileobj, int):
+        fd = fileobj
+    else:
+        try:
+            fd = int(fileobj.fileno())
+        except (AttributeError, TypeError, ValueError):
+            raise ValueError("Invalid file object: %r" % (fileobj,))
+    if fd < 0:
+        raise ValueError("Invalid file descriptor: %d" % fd)
+    return fd
+
+
+def _timeout_ms(timeout):
+    if timeout is None:
+        return -1
+    if timeout <= 0:
+        return 0
+    return math.ceil(timeout * 1000)
+
+
+class BaseSelector:
+    # Keys are stored in a dict by fd, so all lookups are O(1).
+
+    def __init__(self):
+        self._map = {}
+
+    def _key(self, fileobj):
+        try:
+            return self._map[_fileobj_to_fd(fileobj)]
+        except KeyError:
+            raise KeyError("%r is not registered" % (fileobj,))
+
+    def register(self, fileobj, events, data=None):
+        if not events or events & ~(EVENT_READ | EVENT_WRITE):
+            raise ValueError("Invalid events: %r" % (events,))
+        fd = _fileobj_to_fd(fileobj)
+        if fd in self._map:
+            raise KeyError("%r is already registered" % (fileobj,))
+        key = SelectorKey(fileobj, fd, events, data)
+        self._map[fd] = key
+        return key
+
+    def unregister(self, fileobj):
+        key = self._key(fileobj)
+        del self._map[key.fd]
+        return key
+
+    def modify(self, fileobj, events, data=None):
+        key = self._key(fileobj)
+        if events != key.events:
+            self.unregister(fileobj)
+            return self.register(fileobj, events, data)
+        if data != key.data:
+            key = SelectorKey(key.fileobj, key.fd, events, data)
+            self._map[key.fd] = key
+        return key
+
+    def select(self, timeout=None):
+        raise NotImplementedError
+
+    def get_key(self, fileobj):
+        return self._key(fileobj)
+
+    def get_map(self):
+        # Unlike CPython, keys of the mapping are fd's, not file objects
+        return self._map
+
+    def close(self):
+        self._map.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class PollSelector(BaseSelector):
+
+    def __init__(self):
+        super().__init__()
+        self._poll = uselect.poll()
+
+    @staticmethod
+    def _mask(events):
+        mask = 0
+        if events & EVENT_READ:
+            mask |= uselect.POLLIN
+        if events & EVENT_WRITE:
+            mask |= uselect.POLLOUT
+        return mask
+
+    def register(self, fileobj, events, data=None):
+        key = super().register(fileobj, events, data)
+        self._poll.register(fileobj, self._mask(events))
+        return key
+
+    def unregister(self, fileobj):
+        key = super().unregister(fileobj)
+        self._poll.unregister(key.fileobj)
+        return key
+
+    def modify(self, fileobj, events, data=None):
+        key = self._key(fileobj)
+        if events != key.events:
+            if not events or events & ~(EVENT_READ | EVENT_WRITE):
+                raise ValueError("Invalid events: %r" % (events,))
+            self._poll.modify(key.fileobj, self._mask(events))
+        if events != key.events or data != key.data:
+            key = SelectorKey(key.fileobj, key.fd, events, data)
+            self._map[key.fd] = key
+        return key
+
+    def select(self, timeout=None):
+        ready = []
+        for obj, ev in self._poll.ipoll(_timeout_ms(timeout)):
+            key = self._map.get(_fileobj_to_fd(obj))
+            if key is None:
+                continue
+            events = 0
+            if ev & ~uselect.POLLOUT:
+                events |= EVENT_READ
+            if ev & ~uselect.POLLIN:
+                events |= EVENT_WRITE
+            ready.append((key, events & key.events))
+        return ready
+
+
+class EpollSelector(BaseSelector):
+
+    def __init__(self):
+        super().__init__()
+        self._epoll = _epoll()
+
+    @staticmethod
+    def _mask(events):
+        mask = 0
+        if events & EVENT_READ:
+            mask |= select.EPOLLIN
+        if events & EVENT_WRITE:
+            mask |= select.EPOLLOUT
+        return mask
+
+    def register(self, fileobj, events, data=None):
+        key = super().register(fileobj, events, data)
+        # Epoll returns key itself in poll results, so no lookup is needed
+        self._epoll.register(key.fd, self._mask(events), key)
+        return key
+
+    def unregister(self, fileobj):
+        key = super().unregister(fileobj)
+        self._epoll.unregister(key.fd)
+        return key
+
+    def modify(self, fileobj, events, data=None):
+        key = self._key(fileobj)
+        if events != key.events:
+            if not events or events & ~(EVENT_READ | EVENT_WRITE):
+                raise ValueError("Invalid events: %r" % (events,))
+        if events != key.events or data != key.data:
+            key = SelectorKey(key.fileobj, key.fd, events, data)
+            self._map[key.fd] = key
+            # Re-registering existing fd modifies it, and updates key
+            # returned in poll results.
+            self._epoll.register(key.fd, self._mask(events), key)
+        return key
+
+    def select(self, timeout=None):
+        ready = []
+        for res in self._epoll.ipoll(_timeout_ms(timeout)):
+            key = res[0]
+            ev = res[1]
+            events = 0
+            if ev & ~select.EPOLLOUT:
+                events |= EVENT_READ
+            if ev & ~select.EPOLLIN:
+                events |= EVENT_WRITE
+            ready.append((key, events & key.events))
+        return ready
+
+    def close(self):
+        self._epoll.close()
+        super().close()
+
+
+if _epoll:
+    DefaultSelector = EpollSelector
+else:
+    DefaultSelector = PollSelector
@@ -0,0 +1,37 @@
+import os
+import selectors
+
+
+for cls in (selectors.DefaultSelector, selectors.PollSelector):
+    sel = cls()
+    r, w = os.pipe()
+
+    key = sel.register(r, selectors.EVENT_READ, "reader")
+    assert key.fd == r and key.data == "reader"
+    assert sel.get_key(r) is key
+    assert sel.select(0) == []
+
+    os.write(w, b"x")
+    res = sel.select(1)
+    assert len(res) == 1
+    assert res[0][0] is key and res[0][1] == selectors.EVENT_READ
+
+    key = sel.modify(r, selectors.EVENT_READ, "reader2")
+    res = sel.select(0)
+    assert res[0][0].data == "reader2"
+
+    sel.register(w, selectors.EVENT_WRITE)
+    res = sel.select(0)
+    assert sorted([(k.fd, ev) for k, ev in res]) == sorted([(r, selectors.EVENT_READ), (w, selectors.EVENT_WRITE)])
+
+    sel.unregister(r)
+    try:
+        sel.get_key(r)
+        assert False
+    except KeyError:
+        pass
+    sel.close()
+    os.close(r)
+    os.close(w)
+
+print("OK")
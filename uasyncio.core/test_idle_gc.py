@@ -0,0 +1,85 @@
+# Test garbage collection in idle time of event loop.
+import uasyncio.core as asyncio
+import uasyncio.idlegc
+from uasyncio.idlegc import IdleGC
+
+
+def busy():
+    # Never lets the loop sleep
+    for i in range(20):
+        yield
+
+
+def worker(n):
+    for i in range(n):
+        yield from asyncio.sleep_ms(20)
+
+
+loop = asyncio.get_event_loop()
+loop.set_stats(True)
+
+# Any heap growth triggers a collection
+policy = IdleGC(threshold=0)
+loop.set_idle_hook(policy)
+loop.run_until_complete(busy())
+assert policy.n == 0, policy.n
+
+loop.run_until_complete(worker(5))
+assert policy.n >= 5, policy.n
+assert policy.max_us >= policy.last_us > 0
+st = loop.get_stats()
+assert st["gc_n"] == policy.n
+assert st["gc_us"] >= policy.total_us
+
+# Pause doesn't fit into budget, and heap usage is below force level
+policy2 = IdleGC(threshold=0, budget_ms=0, force=101)
+policy2.last_us = 1000
+loop.set_idle_hook(policy2)
+loop.run_until_complete(worker(3))
+assert policy2.n == 0
+assert policy2.skipped >= 3
+
+# A slow collection doesn't stop idle collections for good: the pause
+# estimate decays while they're skipped
+policy2 = IdleGC(threshold=0, budget_ms=1, force=101)
+policy2.last_us = 100000
+loop.set_idle_hook(policy2)
+loop.run_until_complete(worker(10))
+assert policy2.n >= 1 and policy2.skipped >= 6, (policy2.n, policy2.skipped)
+
+# Steady high heap usage (live data which collection doesn't free)
+# triggers a single collection, not one per idle point
+class FakeGC:
+
+    def __init__(self, live, size):
+        self.alloc = live
+        self.size = size
+        self.n = 0
+
+    def mem_alloc(self):
+        return self.alloc
+
+    def mem_free(self):
+        return self.size - self.alloc
+
+    def collect(self):
+        self.n += 1
+
+
+fake = FakeGC(90000, 100000)
+real_gc = uasyncio.idlegc.gc
+uasyncio.idlegc.gc = fake
+try:
+    policy3 = IdleGC()
+    loop.set_idle_hook(policy3)
+    loop.run_until_complete(worker(5))
+    assert policy3.n == fake.n == 1, (policy3.n, fake.n)
+    # Growth by threshold % of heap size since then triggers another one
+    fake.alloc += 25000
+    loop.run_until_complete(worker(3))
+    assert policy3.n == fake.n == 2, (policy3.n, fake.n)
+finally:
+    uasyncio.idlegc.gc = real_gc
+
+loop.set_idle_hook(None)
+print("OK")
@@ -0,0 +1,25 @@
+# Test that growable runq doesn't overflow under a burst of scheduled
+# callbacks, and that high-water mark is tracked.
+import uasyncio.core as asyncio
+
+
+N = 100
+result = []
+
+def cb(n):
+    result.append(n)
+
+def burst():
+    for i in range(N):
+        loop.call_soon(cb, i)
+    yield
+
+
+loop = asyncio.get_event_loop(runq_len=4, runq_grow=True)
+loop.run_until_complete(burst())
+
+assert result == list(range(N)), result
+# Each callback takes 2 runq entries
+assert loop.runq_hwm >= 2 * N, loop.runq_hwm
+assert loop.runq_len >= loop.runq_hwm
+print("OK", loop.runq_len, loop.runq_hwm)
@@ -0,0 +1,30 @@
+# Test collection of event loop performance counters.
+import uasyncio.core as asyncio
+
+
+def worker(n):
+    for i in range(n):
+        yield from asyncio.sleep_ms(10)
+
+
+def main():
+    loop.create_task(worker(5))
+    yield from asyncio.sleep_ms(100)
+    st = loop.get_stats()
+    print(st)
+    assert st["iters"] > 0
+    assert st["lag_n"] >= 5
+    assert st["lag_max_ms"] >= 0
+    assert sum(st["runq_hist"]) == st["iters"]
+    assert sum(st["waitq_hist"]) == st["iters"]
+    assert st["wait_us"] > 0
+    # Finished coroutines are not tracked, but we're still running
+    assert len(st["tasks"]) >= 1
+    loop.set_stats(False)
+    assert loop.get_stats() is None
+
+
+loop = asyncio.get_event_loop()
+assert loop.get_stats() is None
+loop.set_stats(True)
+loop.run_until_complete(main())
@@ -0,0 +1,39 @@
+# Test suspend()/resume(): resume() of a task which was cancelled while
+# suspended (but didn't run yet) doesn't wipe the pending exception or
+# schedule the task twice.
+import uasyncio.core as asyncio
+
+
+log = []
+
+
+def waiter(name):
+    try:
+        yield from asyncio.suspend()
+        log.append((name, "resumed"))
+        yield from asyncio.sleep_ms(50)
+        log.append((name, "slept"))
+    except asyncio.CancelledError:
+        log.append((name, "cancelled"))
+
+
+def main():
+    w1 = waiter(1)
+    w2 = waiter(2)
+    loop.create_task(w1)
+    loop.create_task(w2)
+    yield from asyncio.sleep_ms(10)
+    asyncio.cancel(w1)
+    assert not asyncio.resume(w1)
+    assert asyncio.resume(w2)
+    # Already resumed
+    assert not asyncio.resume(w2)
+    yield from asyncio.sleep_ms(10)
+    assert log == [(1, "cancelled"), (2, "resumed")], log
+    yield from asyncio.sleep_ms(100)
+    assert log[-1] == (2, "slept"), log
+
+
+loop = asyncio.get_event_loop()
+loop.run_until_complete(main())
+print("OK")
@@ -0,0 +1,41 @@
+# Test that timers scheduled with call_later_ms() can be cancelled via
+# returned handle, and that cancelled timers don't exhaust fixed-size waitq.
+import uasyncio.core as uasyncio
+
+
+class MockEventLoop(uasyncio.EventLoop):
+
+    def __init__(self, timer_wheel):
+        self.t = 0
+        super().__init__(timer_wheel=timer_wheel)
+        self.msgs = []
+
+    def time(self):
+        return self.t
+
+    def wait(self, delay):
+        if delay < 0:
+            raise StopIteration
+        self.t += delay or 1
+
+
+for timer_wheel in (False, True):
+    loop = MockEventLoop(timer_wheel)
+
+    def cb(n):
+        loop.msgs.append(n)
+
+    # Default waitq_len is 16, so this would overflow without purging
+    # of cancelled entries.
+    for i in range(100):
+        h = loop.call_later_ms(1000 + i, cb, i)
+        if i % 10:
+            h.cancel()
+
+    try:
+        loop.run_forever()
+    except StopIteration:
+        pass
+
+    print(loop.msgs)
+    assert loop.msgs == list(range(0, 100, 10)), loop.msgs
@@ -0,0 +1,43 @@
+# Test that EventLoop with timer wheel waitq runs callbacks in the order
+# of their due times, not prematurely, and isn't limited in size.
+import uasyncio.core as uasyncio
+
+
+class MockEventLoop(uasyncio.EventLoop):
+
+    def __init__(self):
+        self.t = 0
+        super().__init__(timer_wheel=True)
+        self.msgs = []
+
+    def time(self):
+        return self.t
+
+    def wait(self, delay):
+        if delay < 0:
+            raise StopIteration
+        # Pretend we slept for the requested time, but make it 1 tick
+        # for a busy loop, to let time pass in any case.
+        self.t += delay or 1
+
+
+loop = MockEventLoop()
+
+def cb(t):
+    assert loop.time() >= t, (loop.time(), t)
+    loop.msgs.append(t)
+
+# Way more than utimeq(16) can hold
+delays = [(i * 7919) % 100000 for i in range(1000)]
+for d in delays:
+    loop.call_later_ms(d, cb, d)
+
+try:
+    loop.run_forever()
+except StopIteration:
+    pass
+
+assert loop.msgs == sorted(delays), loop.msgs
+# Loop shouldn't oversleep past the last due time
+assert loop.time() == max(delays)
+print("OK")
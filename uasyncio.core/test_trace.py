@@ -0,0 +1,36 @@
+# Test recording of scheduling events and their export in Chrome trace
+# event format.
+import uio
+import ujson
+import uasyncio.core as asyncio
+from uasyncio.trace import Tracer
+
+
+def worker(n):
+    for i in range(n):
+        yield from asyncio.sleep_ms(5)
+        yield
+
+
+def main():
+    loop.create_task(worker(10))
+    yield from asyncio.sleep_ms(100)
+
+
+loop = asyncio.get_event_loop()
+# Too small to hold all events, to exercise ring wraparound
+tracer = Tracer(16)
+loop.set_stats(tracer)
+loop.run_until_complete(main())
+
+buf = uio.StringIO()
+tracer.dump(buf)
+trace = ujson.loads(buf.getvalue())
+events = [e for e in trace["traceEvents"] if e["ph"] == "X"]
+assert len(events) == 16, len(events)
+names = [e["name"] for e in events]
+print(names)
+assert "wait" in names
+assert "done" in names
+ts = [e["ts"] for e in events]
+assert ts[0] == 0 and ts == sorted(ts), ts
@@ -24,11 +24,39 @@ class TimeoutError(CancelledError):
     pass
 
 
+class TimerHandle:
+    # Returned by call_later*()/call_at_(). Cancelling leaves a tombstone
+    # in the waitq, which is skipped when it expires.
+
+    def __init__(self, cb):
+        self.cb = cb
+
+    def cancel(self):
+        self.cb = None
+
+
 class EventLoop:
 
-    def __init__(self, runq_len=16, waitq_len=16):
+    def __init__(self, runq_len=16, waitq_len=16, timer_wheel=False, runq_grow=False):
         self.runq = ucollections.deque((), runq_len, True)
-        self.waitq = utimeq.utimeq(waitq_len)
+        self.runq_len = runq_len
+        # If set, runq is reallocated with double size instead of
+        # overflowing.
+        self.runq_grow = runq_grow
+        # High-water mark of runq entries (callbacks take 2 entries,
+        # coroutines - 1), can be used to size runq_len.
+        self.runq_hwm = 0
+        # LoopStats instance, see set_stats()
+        self.stats = None
+        # See set_idle_hook()
+        self.idle_hook = None
+        if timer_wheel:
+            # Unbounded waitq with O(1) insertion and expiry, for
+            # applications with many pending timeouts.
+            from uasyncio.wheel import TimerWheel
+            self.waitq = TimerWheel(self.time)
+        else:
+            self.waitq = utimeq.utimeq(waitq_len)
         # Current task being run. Task is a top-level coroutine scheduled
         # in the event loop (sub-coroutines executed transparently by
         # yield from/await, event loop "doesn't see" them).
@@ -39,28 +67,88 @@ class EventLoop:
 
     def create_task(self, coro):
         # CPython 3.4.2
-        self.call_later_ms(0, coro)
+        self.call_soon(coro)
         # CPython asyncio incompatibility: we don't return Task object
 
     def call_soon(self, callback, *args):
         if __debug__ and DEBUG:
             log.debug("Scheduling in runq: %s", (callback, args))
-        self.runq.append(callback)
+        runq = self.runq
+        if self.runq_grow and len(runq) + 2 > self.runq_len:
+            runq = self._grow_runq()
+        runq.append(callback)
         if not isinstance(callback, type_gen):
-            self.runq.append(args)
+            runq.append(args)
+        l = len(runq)
+        if l > self.runq_hwm:
+            self.runq_hwm = l
+
+    def _grow_runq(self):
+        old = self.runq
+        self.runq_len *= 2
+        if __debug__ and DEBUG:
+            log.debug("Growing runq to: %d", self.runq_len)
+        runq = ucollections.deque((), self.runq_len, True)
+        while old:
+            runq.append(old.popleft())
+        self.runq = runq
+        return runq
 
     def call_later(self, delay, callback, *args):
-        self.call_at_(time.ticks_add(self.time(), int(delay * 1000)), callback, args)
+        return self.call_at_(time.ticks_add(self.time(), int(delay * 1000)), callback, args)
 
     def call_later_ms(self, delay, callback, *args):
-        if not delay:
-            return self.call_soon(callback, *args)
-        self.call_at_(time.ticks_add(self.time(), delay), callback, args)
+        return self.call_at_(time.ticks_add(self.time(), delay), callback, args)
 
     def call_at_(self, time, callback, args=()):
         if __debug__ and DEBUG:
             log.debug("Scheduling in waitq: %s", (time, callback, args))
-        self.waitq.push(time, callback, args)
+        h = TimerHandle(callback)
+        self.waitq_push(time, h, args)
+        return h
+
+    def waitq_push(self, t, callback, args):
+        try:
+            self.waitq.push(t, callback, args)
+        except IndexError:
+            # Fixed-size waitq is full, try to make room by dropping
+            # tombstones of cancelled timers.
+            waitq = self.waitq
+            live = []
+            e = [0, 0, 0]
+            while waitq:
+                waitq.pop(e)
+                cb = e[1]
+                if not (isinstance(cb, TimerHandle) and cb.cb is None):
+                    live.append((e[0], cb, e[2]))
+            if __debug__ and DEBUG:
+                log.debug("waitq full, purged tombstones: %d live entries", len(live))
+            for e in live:
+                waitq.push(e[0], e[1], e[2])
+            waitq.push(t, callback, args)
+
+    def set_stats(self, val):
+        # Enable/disable collection of loop performance counters. When
+        # disabled, run_forever() pays just a few truth tests per iteration.
+        # Instead of True, an instance of LoopStats subclass (e.g.
+        # uasyncio.trace.Tracer) can be passed.
+        if val is True:
+            from uasyncio.stats import LoopStats
+            val = LoopStats()
+        self.stats = val or None
+
+    def set_idle_hook(self, hook):
+        # hook.idle(loop, delay) is called when the loop is about to wait
+        # (with nothing in runq) for delay ms (-1 if there're no timers),
+        # and returns delay to actually wait, e.g. less time it spent. See
+        # uasyncio.idlegc.IdleGC.
+        self.idle_hook = hook
+
+    def get_stats(self):
+        # Return snapshot of performance counters as a dict, or None if
+        # not enabled.
+        if self.stats:
+            return self.stats.snapshot()
 
     def wait(self, delay):
         # Default wait implementation, to be overriden in subclasses
@@ -72,6 +160,9 @@ class EventLoop:
     def run_forever(self):
         cur_task = [0, 0, 0]
         while True:
+            stats = self.stats
+            if stats:
+                t_iter = time.ticks_us()
             # Expire entries in waitq and move them to runq
             tnow = self.time()
             while self.waitq:
@@ -80,14 +171,24 @@ class EventLoop:
                 if delay > 0:
                     break
                 self.waitq.pop(cur_task)
+                cb = cur_task[1]
+                if isinstance(cb, TimerHandle):
+                    cb = cb.cb
+                    if cb is None:
+                        # Cancelled
+                        continue
+                if stats:
+                    stats.timer_lag(-delay)
                 if __debug__ and DEBUG:
-                    log.debug("Moving from waitq to runq: %s", cur_task[1])
-                self.call_soon(cur_task[1], *cur_task[2])
+                    log.debug("Moving from waitq to runq: %s", cb)
+                self.call_soon(cb, *cur_task[2])
 
             # Process runq
             l = len(self.runq)
             if __debug__ and DEBUG:
                 log.debug("Entries in runq: %d", l)
+            if stats:
+                stats.depth(l, len(self.waitq))
             while l:
                 cb = self.runq.popleft()
                 l -= 1
@@ -97,18 +198,27 @@ class EventLoop:
                     l -= 1
                     if __debug__ and DEBUG:
                         log.info("Next callback to run: %s", (cb, args))
-                    cb(*args)
+                    if stats:
+                        t0 = time.ticks_us()
+                        cb(*args)
+                        stats.cb_run(cb, t0)
+                    else:
+                        cb(*args)
                     continue
 
                 if __debug__ and DEBUG:
                     log.info("Next coroutine to run: %s", (cb, args))
                 self.cur_task = cb
                 delay = 0
+                if stats:
+                    t0 = time.ticks_us()
                 try:
                     if args is ():
                         ret = next(cb)
                     else:
                         ret = cb.send(*args)
+                    if stats:
+                        stats.task_run(cb, t0, ret)
                     if __debug__ and DEBUG:
                         log.info("Coroutine %s yield result: %s", cb, ret)
                     if isinstance(ret, SysCall1):
@@ -147,16 +257,25 @@ class EventLoop:
                 except StopIteration as e:
                     if __debug__ and DEBUG:
                         log.debug("Coroutine finished: %s", cb)
+                    if stats:
+                        stats.task_done(cb, t0)
                     continue
                 except CancelledError as e:
                     if __debug__ and DEBUG:
                         log.debug("Coroutine cancelled: %s", cb)
+                    if stats:
+                        stats.task_done(cb, t0)
                     continue
                 # Currently all syscalls don't return anything, so we don't
                 # need to feed anything to the next invocation of coroutine.
                 # If that changes, need to pass that value below.
                 if delay:
-                    self.call_later_ms(delay, cb)
+                    # Sleeping coroutines are put to waitq directly, they
+                    # are cancelled via cancel() and don't need a handle.
+                    t = time.ticks_add(self.time(), delay)
+                    if __debug__ and DEBUG:
+                        log.debug("Scheduling in waitq: %s", (t, cb))
+                    self.waitq_push(t, cb, ())
                 else:
                     self.call_soon(cb)
 
@@ -170,7 +289,15 @@ class EventLoop:
                     delay = time.ticks_diff(t, tnow)
                     if delay < 0:
                         delay = 0
-            self.wait(delay)
+                if self.idle_hook and delay:
+                    delay = self.idle_hook.idle(self, delay)
+            if stats:
+                stats.busy(t_iter)
+                t_iter = time.ticks_us()
+                self.wait(delay)
+                stats.wait(t_iter)
+            else:
+                self.wait(delay)
 
     def run_until_complete(self, coro):
         def _run_and_stop():
@@ -218,10 +345,10 @@ class IOWriteDone(SysCall1):
 
 _event_loop = None
 _event_loop_class = EventLoop
-def get_event_loop(runq_len=16, waitq_len=16):
+def get_event_loop(runq_len=16, waitq_len=16, timer_wheel=False, runq_grow=False):
     global _event_loop
     if _event_loop is None:
-        _event_loop = _event_loop_class(runq_len, waitq_len)
+        _event_loop = _event_loop_class(runq_len, waitq_len, timer_wheel, runq_grow)
     return _event_loop
 
 def sleep(secs):
@@ -263,32 +390,45 @@ def cancel(coro):
         _event_loop.call_soon(coro)
 
 
-class TimeoutObj:
-    def __init__(self, coro):
-        self.coro = coro
+def suspend():
+    # Wait (without being rescheduled) until resume() of the current
+    # task. cancel()/wait_for() still end the wait, raising in the task.
+    _event_loop.cur_task.pend_throw(False)
+    yield False
 
 
-def wait_for_ms(coro, timeout):
+def resume(task):
+    # Resume task waiting in suspend(). Returns False, leaving the task
+    # alone, if it's not waiting anymore (was cancelled, timed out or
+    # already resumed, and is scheduled for that), so what it was going
+    # to be woken up for should go to another waiter.
+    prev = task.pend_throw(None)
+    if prev is not False:
+        task.pend_throw(prev)
+        return False
+    _event_loop.call_soon(task)
+    return True
 
-    def waiter(coro, timeout_obj):
-        res = yield from coro
-        if __debug__ and DEBUG:
-            log.debug("waiter: cancelling %s", timeout_obj)
-        timeout_obj.coro = None
-        return res
 
-    def timeout_func(timeout_obj):
-        if timeout_obj.coro:
-            if __debug__ and DEBUG:
-                log.debug("timeout_func: cancelling %s", timeout_obj.coro)
-            prev = timeout_obj.coro.pend_throw(TimeoutError())
-            #print("prev pend", prev)
-            if prev is False:
-                _event_loop.call_soon(timeout_obj.coro)
-
-    timeout_obj = TimeoutObj(_event_loop.cur_task)
-    _event_loop.call_later_ms(timeout, timeout_func, timeout_obj)
-    return (yield from waiter(coro, timeout_obj))
+def _timeout_func(task):
+    if __debug__ and DEBUG:
+        log.debug("timeout_func: cancelling %s", task)
+    prev = task.pend_throw(TimeoutError())
+    #print("prev pend", prev)
+    if prev is False:
+        _event_loop.call_soon(task)
+
+
+def wait_for_ms(coro, timeout):
+    # The timer handle serves as the deadline object: if coro finishes
+    # (or fails) first, it's cancelled and its waitq entry is skipped.
+    h = _event_loop.call_later_ms(timeout, _timeout_func, _event_loop.cur_task)
+    try:
+        return (yield from coro)
+    finally:
+        if __debug__ and DEBUG:
+            log.debug("wait_for_ms: cancelling %s", h)
+        h.cancel()
 
 
 def wait_for(coro, timeout):
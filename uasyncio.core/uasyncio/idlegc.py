@@ -0,0 +1,66 @@
+import gc
+import utime as time
+
+
+class IdleGC:
+    # Idle hook (see loop.set_idle_hook()) running gc.collect() when the
+    # loop is about to sleep, so that collections happen in idle gaps,
+    # instead of when an allocation fails in the middle of handling an
+    # event. MicroPython's GC isn't incremental, so a collection is done
+    # only if its pause is expected to fit into the idle gap:
+    #
+    # - threshold: growth of heap usage since the last collection (% of
+    #   heap size) starting from which to collect. (Absolute usage would
+    #   make a program with big live data collect at every idle point.)
+    # - budget_ms: max pause to take out of an idle gap; a collection is
+    #   skipped if the last measured pause exceeds it (or the time until
+    #   the next timer, if less). The estimate is halved on each skip, so
+    #   a single slow collection doesn't stop idle collections for good.
+    # - force: heap usage (%) starting from which a collection due per
+    #   threshold is done regardless of the budget.
+    #
+    # Pause times are kept in n/total_us/max_us/last_us, and reported to
+    # loop stats (set_stats()), if enabled.
+
+    def __init__(self, threshold=25, budget_ms=10, force=85):
+        self.threshold = threshold
+        self.budget_ms = budget_ms
+        self.force = force
+        # Heap usage (bytes) after the last collection
+        self.base = 0
+        self.n = 0
+        self.skipped = 0
+        self.total_us = 0
+        self.max_us = 0
+        self.last_us = 0
+
+    def idle(self, loop, delay):
+        alloc = gc.mem_alloc()
+        size = alloc + gc.mem_free()
+        if (alloc - self.base) * 100 < self.threshold * size:
+            return delay
+        used = alloc * 100 // size
+        if used < self.force:
+            avail = self.budget_ms
+            if 0 <= delay < avail:
+                avail = delay
+            if self.last_us > avail * 1000:
+                self.skipped += 1
+                self.last_us //= 2
+                return delay
+        t0 = time.ticks_us()
+        gc.collect()
+        dt = time.ticks_diff(time.ticks_us(), t0)
+        self.base = gc.mem_alloc()
+        self.n += 1
+        self.total_us += dt
+        self.last_us = dt
+        if dt > self.max_us:
+            self.max_us = dt
+        if loop.stats:
+            loop.stats.gc_run(t0)
+        if delay > 0:
+            delay -= (dt + 999) // 1000
+            if delay < 0:
+                delay = 0
+        return delay
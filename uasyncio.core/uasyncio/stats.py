@@ -0,0 +1,126 @@
+import utime as time
+
+
+# Number of buckets in depth histograms. Bucket 0 counts zero depth,
+# bucket i counts depths in range [2**(i-1), 2**i), the last bucket
+# also counts everything above.
+HIST_LEN = 12
+
+
+def _hist(h, v):
+    i = 0
+    while v:
+        i += 1
+        v >>= 1
+    if i >= HIST_LEN:
+        i = HIST_LEN - 1
+    h[i] += 1
+
+
+class LoopStats:
+    # Counters maintained by EventLoop.run_forever() when enabled with
+    # loop.set_stats(True). Times are in microseconds, except for timer
+    # lag, which is in loop time units (milliseconds).
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.iters = 0
+        self.busy_us = 0
+        self.busy_max_us = 0
+        self.wait_us = 0
+        self.wait_max_us = 0
+        self.lag_n = 0
+        self.lag_ms = 0
+        self.lag_max_ms = 0
+        self.cb_n = 0
+        self.cb_us = 0
+        # Garbage collections by idle hook (uasyncio.idlegc)
+        self.gc_n = 0
+        self.gc_us = 0
+        self.gc_max_us = 0
+        self.runq_hist = [0] * HIST_LEN
+        self.waitq_hist = [0] * HIST_LEN
+        # Top-level coroutine -> [run time, number of steps]
+        self.tasks = {}
+
+    def timer_lag(self, lag):
+        self.lag_n += 1
+        self.lag_ms += lag
+        if lag > self.lag_max_ms:
+            self.lag_max_ms = lag
+
+    def depth(self, runq, waitq):
+        self.iters += 1
+        _hist(self.runq_hist, runq)
+        _hist(self.waitq_hist, waitq)
+
+    def task_run(self, coro, t0, ret):
+        # ret is the value yielded by the coroutine
+        self.task_time(coro, time.ticks_diff(time.ticks_us(), t0))
+
+    def task_time(self, coro, dt):
+        try:
+            v = self.tasks[coro]
+            v[0] += dt
+            v[1] += 1
+        except KeyError:
+            self.tasks[coro] = [dt, 1]
+
+    def task_done(self, coro, t0):
+        # Don't keep finished coroutines alive
+        self.tasks.pop(coro, None)
+
+    def cb_run(self, cb, t0):
+        self.cb_time(cb, time.ticks_diff(time.ticks_us(), t0))
+
+    def cb_time(self, cb, dt):
+        self.cb_n += 1
+        self.cb_us += dt
+
+    def gc_run(self, t0):
+        self.gc_time(time.ticks_diff(time.ticks_us(), t0))
+
+    def gc_time(self, dt):
+        self.gc_n += 1
+        self.gc_us += dt
+        if dt > self.gc_max_us:
+            self.gc_max_us = dt
+
+    def busy(self, t0):
+        dt = time.ticks_diff(time.ticks_us(), t0)
+        self.busy_us += dt
+        if dt > self.busy_max_us:
+            self.busy_max_us = dt
+
+    def wait(self, t0):
+        self.wait_time(time.ticks_diff(time.ticks_us(), t0))
+
+    def wait_time(self, dt):
+        self.wait_us += dt
+        if dt > self.wait_max_us:
+            self.wait_max_us = dt
+
+    def snapshot(self):
+        tasks = {}
+        for k, v in self.tasks.items():
+            tasks[k] = (v[0], v[1])
+        return {
+            "iters": self.iters,
+            "busy_us": self.busy_us,
+            "busy_max_us": self.busy_max_us,
+            "wait_us": self.wait_us,
+            "wait_max_us": self.wait_max_us,
+            "lag_n": self.lag_n,
+            "lag_ms": self.lag_ms,
+            "lag_max_ms": self.lag_max_ms,
+            "cb_n": self.cb_n,
+            "cb_us": self.cb_us,
+            "gc_n": self.gc_n,
+            "gc_us": self.gc_us,
+            "gc_max_us": self.gc_max_us,
+            "runq_hist": self.runq_hist[:],
+            "waitq_hist": self.waitq_hist[:],
+            "tasks": tasks,
+        }
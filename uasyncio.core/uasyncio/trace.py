@@ -0,0 +1,127 @@
+import utime as time
+import ujson
+from uasyncio.core import SysCall1, SleepMs, type_gen
+from uasyncio.stats import LoopStats
+
+
+def _name(what):
+    if isinstance(what, str):
+        return what
+    if what is None:
+        return "yield"
+    if what is False:
+        return "suspend"
+    if isinstance(what, int):
+        return "sleep_ms(%d)" % what
+    if what is type_gen:
+        return "spawn"
+    return what.__name__
+
+
+class Tracer(LoopStats):
+    # Records scheduling events of EventLoop.run_forever() into a ring
+    # buffer of fixed size, and dumps them in Chrome trace event format,
+    # which can be loaded into chrome://tracing or https://ui.perfetto.dev .
+    # Usage:
+    #
+    # tracer = Tracer(4096)
+    # loop.set_stats(tracer)
+    # ...
+    # with open("trace.json", "w") as f:
+    #     tracer.dump(f)
+    #
+    # Each event is a run of a coroutine step (named after what it yielded),
+    # a callback, a wait for I/O/timers, or an idle-time garbage collection
+    # (shown along with waits). Besides that, all LoopStats counters are
+    # maintained too.
+
+    def __init__(self, size=1024):
+        self.size = size
+        self.ts = [0] * size
+        self.dur = [0] * size
+        self.obj = [None] * size
+        self.what = [None] * size
+        super().__init__()
+
+    def reset(self):
+        super().reset()
+        # Next position to write and number of recorded events
+        self.i = 0
+        self.n = 0
+        for i in range(self.size):
+            self.obj[i] = None
+            self.what[i] = None
+
+    def _add(self, t0, dt, obj, what):
+        i = self.i
+        self.ts[i] = t0
+        self.dur[i] = dt
+        self.obj[i] = obj
+        self.what[i] = what
+        i += 1
+        if i == self.size:
+            i = 0
+        self.i = i
+        if self.n < self.size:
+            self.n += 1
+
+    def task_run(self, coro, t0, ret):
+        dt = time.ticks_diff(time.ticks_us(), t0)
+        self.task_time(coro, dt)
+        # Don't keep references to syscall args (sockets, etc.), only
+        # record the kind of the syscall.
+        if isinstance(ret, SleepMs):
+            ret = ret.arg
+        elif isinstance(ret, SysCall1):
+            ret = type(ret)
+        elif isinstance(ret, type_gen):
+            ret = type_gen
+        self._add(t0, dt, coro, ret)
+
+    def task_done(self, coro, t0):
+        super().task_done(coro, t0)
+        self._add(t0, time.ticks_diff(time.ticks_us(), t0), coro, "done")
+
+    def cb_run(self, cb, t0):
+        dt = time.ticks_diff(time.ticks_us(), t0)
+        self.cb_time(cb, dt)
+        self._add(t0, dt, cb, "callback")
+
+    def wait(self, t0):
+        dt = time.ticks_diff(time.ticks_us(), t0)
+        self.wait_time(dt)
+        self._add(t0, dt, None, "wait")
+
+    def gc_run(self, t0):
+        dt = time.ticks_diff(time.ticks_us(), t0)
+        self.gc_time(dt)
+        self._add(t0, dt, None, "gc")
+
+    def dump(self, f):
+        n = self.n
+        i = self.i - n
+        if i < 0:
+            i += self.size
+        base = self.ts[i]
+        # Coroutines/callbacks are shown as threads, tid 0 is for waits
+        tids = {}
+        f.write('{"traceEvents":[\n')
+        for k in range(n):
+            obj = self.obj[i]
+            if obj is None:
+                tid = 0
+            else:
+                tid = tids.get(obj)
+                if tid is None:
+                    tid = tids[obj] = len(tids) + 1
+            f.write('{"name":%s,"ph":"X","pid":1,"tid":%d,"ts":%d,"dur":%d},\n' % (
+                ujson.dumps(_name(self.what[i])), tid,
+                time.ticks_diff(self.ts[i], base), self.dur[i]))
+            i += 1
+            if i == self.size:
+                i = 0
+        f.write('{"name":"thread_name","ph":"M","pid":1,"tid":0,"args":{"name":"wait"}}')
+        for obj, tid in tids.items():
+            f.write(',\n{"name":"thread_name","ph":"M","pid":1,"tid":%d,"args":{"name":%s}}' % (
+                tid, ujson.dumps(repr(obj))))
+        f.write("]}\n")
@@ -0,0 +1,172 @@
+import utime as time
+from uasyncio.core import TimerHandle
+
+
+# Hierarchical timer wheel, usable as a drop-in replacement for utimeq
+# as an EventLoop's waitq (implements the same push/peektime/pop/len
+# interface). Unlike utimeq, it isn't limited in size, and both push
+# and expiry are O(1) (amortized), so it's suitable for applications
+# with many thousands of pending timeouts.
+#
+# Each level has 32 slots. Level 0 slots are 1 tick (ms) wide, level 1
+# slots are 32 ticks wide, and so on. 6 levels cover 30 bits, i.e. the
+# whole ticks_ms() period of most ports. An entry is stored at the lowest
+# level at which its due time and wheel's current time differ, and moved
+# ("cascaded") down the levels as the current time advances.
+
+BITS = 5
+SLOTS = 1 << BITS
+MASK = SLOTS - 1
+LEVELS = 6
+# Masks for tick offset within a slot of each level
+_masks = [(1 << (BITS * l)) - 1 for l in range(LEVELS + 1)]
+# Max step returned by _next(), must be less than half of ticks period
+_MAXSTEP = _masks[LEVELS - 1] + 1
+
+
+class TimerWheel:
+
+    def __init__(self, timefunc):
+        self.time = timefunc
+        # Last tick processed, all entries with due time up to it are
+        # in ready list.
+        self.now = timefunc()
+        self.levels = [[[] for i in range(SLOTS)] for l in range(LEVELS)]
+        self.cnt = [0] * LEVELS
+        # Number of entries stored in levels and overflow
+        self.n = 0
+        # Entries which are further away than the wheel covers (may happen
+        # only on ports with ticks period longer than 30 bits).
+        self.overflow = []
+        # Expired entries, consumed starting from self.ri
+        self.ready = []
+        self.ri = 0
+
+    def __len__(self):
+        return self.n + len(self.ready) - self.ri
+
+    def _insert(self, e):
+        t = e[0]
+        now = self.now
+        if time.ticks_diff(t, now) <= 0:
+            self.ready.append(e)
+            return
+        x = (t ^ now) >> BITS
+        l = 0
+        while x:
+            l += 1
+            x >>= BITS
+        if l >= LEVELS:
+            self.overflow.append(e)
+        else:
+            self.levels[l][(t >> (BITS * l)) & MASK].append(e)
+            self.cnt[l] += 1
+        self.n += 1
+
+    def _cascade(self, now):
+        # now just crossed a level 1 slot boundary, redistribute entries
+        # from slots of higher levels we just entered, highest first.
+        l = 1
+        while l < LEVELS - 1 and not now & _masks[l + 1]:
+            l += 1
+        if l == LEVELS - 1 and not now & _masks[LEVELS] and self.overflow:
+            over = self.overflow
+            self.overflow = []
+            self._reinsert(over)
+        while l:
+            i = (now >> (BITS * l)) & MASK
+            slot = self.levels[l][i]
+            if slot:
+                self.levels[l][i] = []
+                self.cnt[l] -= len(slot)
+                self._reinsert(slot)
+            l -= 1
+
+    def _reinsert(self, entries):
+        self.n -= len(entries)
+        for e in entries:
+            cb = e[1]
+            # Drop cancelled timers instead of moving them around
+            if isinstance(cb, TimerHandle) and cb.cb is None:
+                continue
+            self._insert(e)
+
+    def _advance(self, tnow):
+        levels0 = self.levels[0]
+        cnt = self.cnt
+        now = self.now
+        while True:
+            d = time.ticks_diff(tnow, now)
+            if d <= 0:
+                break
+            if not self.n:
+                now = tnow
+                break
+            # Skip over levels without entries - nothing can expire
+            # until the next slot boundary of the lowest non-empty level.
+            l = 0
+            while l < LEVELS and not cnt[l]:
+                l += 1
+            if l:
+                step = _masks[l] + 1 - (now & _masks[l])
+                if step > d:
+                    step = d
+            else:
+                step = 1
+            now = time.ticks_add(now, step)
+            if not now & MASK:
+                self.now = now
+                self._cascade(now)
+            i = now & MASK
+            slot = levels0[i]
+            if slot:
+                levels0[i] = []
+                cnt[0] -= len(slot)
+                self.n -= len(slot)
+                self.ready.extend(slot)
+        self.now = now
+
+    def _next(self):
+        # Lower bound for the due time of the nearest entry in the wheel.
+        # It may be not exact for higher levels, but at that time, entries
+        # will be cascaded and the next estimate will be more precise.
+        now = self.now
+        for l in range(LEVELS):
+            if self.cnt[l]:
+                slots = self.levels[l]
+                sh = BITS * l
+                cur = (now >> sh) & MASK
+                for j in range(1, SLOTS):
+                    if slots[(cur + j) & MASK]:
+                        break
+                return time.ticks_add(now, min((j << sh) - (now & _masks[l]), _MAXSTEP))
+        # Only overflow entries left
+        return time.ticks_add(now, _MAXSTEP)
+
+    def push(self, t, callback, args):
+        if not self.n:
+            # Wheel was idle, rebase it to the current time
+            self.now = self.time()
+        self._insert((t, callback, args))
+
+    def peektime(self):
+        if self.ri == len(self.ready):
+            self._advance(self.time())
+            if self.ri == len(self.ready):
+                return self._next()
+        return self.ready[self.ri][0]
+
+    def pop(self, res):
+        if self.ri == len(self.ready):
+            self._advance(self.time())
+        ready = self.ready
+        e = ready[self.ri]
+        self.ri += 1
+        if self.ri == len(ready):
+            self.ready = []
+            self.ri = 0
+        else:
+            ready[self.ri - 1] = None
+        res[0] = e[0]
+        res[1] = e[1]
+        res[2] = e[2]
@@ -0,0 +1,98 @@
+# Test Resolver against a local stand-in DNS server
+import ustruct
+import usocket
+import uasyncio
+import uasyncio.udp
+from uasyncio.dns import Resolver
+
+
+PORT = 5354
+
+RECORDS = {
+    # name: (type, rdata, ttl)
+    "a.test": (1, bytes([10, 0, 0, 1]), 60),
+    "nottl.test": (1, bytes([10, 0, 0, 2]), 0),
+    "v6.test": (28, bytes(15) + b"\x01", 60),
+}
+
+queries = []
+
+
+def parse_name(req):
+    parts = []
+    i = 12
+    while req[i]:
+        parts.append(str(req[i + 1:i + 1 + req[i]], "ascii"))
+        i += 1 + req[i]
+    typ = ustruct.unpack(">H", req[i + 1:i + 3])[0]
+    return ".".join(parts), typ, req[12:i + 5]
+
+
+def respond(s, req, addr):
+    name, typ, question = parse_name(req)
+    queries.append(name)
+    if name == "slow.test":
+        yield from uasyncio.sleep_ms(50)
+        name = "a.test"
+    rec = RECORDS.get(name)
+    rcode = 0
+    ans = b""
+    acnt = 0
+    if rec is None:
+        rcode = 3
+    elif rec[0] == typ:
+        # Name is a pointer to the question
+        ans = ustruct.pack(">HHHIH", 0xc00c, typ, 1, rec[2], len(rec[1])) + rec[1]
+        acnt = 1
+    resp = req[:2] + ustruct.pack(">HHHHH", 0x8180 | rcode, 1, acnt, 0, 0) + question + ans
+    yield from uasyncio.udp.sendto(s, resp, addr)
+
+
+def server(s):
+    while True:
+        req, addr = yield from uasyncio.udp.recvfrom(s, 512)
+        uasyncio.get_event_loop().create_task(respond(s, req, addr))
+
+
+def main(r):
+    assert (yield from r.resolve("a.test")) == bytes([10, 0, 0, 1])
+    assert (yield from r.resolve("a.test")) == bytes([10, 0, 0, 1])
+    assert queries == ["a.test"], queries
+    assert r.hits == 1 and r.misses == 1
+
+    assert (yield from r.resolve("v6.test", True)) == bytes(15) + b"\x01"
+
+    # Zero TTL isn't cached
+    yield from r.resolve("nottl.test")
+    yield from r.resolve("nottl.test")
+    assert queries.count("nottl.test") == 2, queries
+
+    try:
+        yield from r.resolve("none.test")
+        assert False
+    except OSError:
+        pass
+
+    # Concurrent lookups of the same name are done with one query
+    res = []
+    def lookup():
+        res.append((yield from r.resolve("slow.test")))
+    loop = uasyncio.get_event_loop()
+    for i in range(3):
+        loop.create_task(lookup())
+    while len(res) < 3:
+        yield from uasyncio.sleep_ms(10)
+    assert res == [bytes([10, 0, 0, 1])] * 3
+    assert queries.count("slow.test") == 1, queries
+    assert r.coalesced == 2
+
+    ai = yield from r.getaddrinfo("a.test", 80)
+    assert ai[0][-1] == usocket.getaddrinfo("10.0.0.1", 80)[0][-1]
+
+
+s = uasyncio.udp.socket()
+s.bind(usocket.getaddrinfo("127.0.0.1", PORT)[0][-1])
+loop = uasyncio.get_event_loop()
+loop.create_task(server(s))
+loop.run_until_complete(main(Resolver(["127.0.0.1"], PORT, timeout=500)))
+print("OK")
@@ -0,0 +1,210 @@
+import utime
+import uio
+import usocket
+import urandom
+import udnspkt
+from uasyncio import core
+import uasyncio.udp
+
+
+DEBUG = 0
+log = None
+
+def set_debug(val):
+    global DEBUG, log
+    DEBUG = val
+    if val:
+        import logging
+        log = logging.getLogger("uasyncio.dns")
+
+
+def read_resolv_conf(fname="/etc/resolv.conf"):
+    res = []
+    try:
+        with open(fname) as f:
+            for l in f:
+                l = l.split()
+                if len(l) >= 2 and l[0] == "nameserver":
+                    res.append(l[1])
+    except OSError:
+        pass
+    return res
+
+
+def _is_numeric(host):
+    for af in (usocket.AF_INET, usocket.AF_INET6):
+        try:
+            usocket.inet_pton(af, host)
+            return True
+        except (OSError, ValueError):
+            pass
+    return False
+
+
+class _Lookup:
+    # Lookup in progress, other requests for the same name wait for it
+
+    def __init__(self):
+        self.res = None
+        self.exc = None
+        self.waiters = []
+
+
+class Resolver:
+
+    def __init__(self, nameservers=None, port=53, timeout=2000, retries=2,
+                 cache_size=64, max_ttl=3600):
+        if nameservers is None:
+            nameservers = read_resolv_conf() or ["127.0.0.1"]
+        # Nameserver addresses are numeric, so this doesn't block
+        self.nameservers = [usocket.getaddrinfo(ns, port, 0, usocket.SOCK_DGRAM)[0] for ns in nameservers]
+        # Timeout (ms) of waiting for a response of one nameserver
+        self.timeout = timeout
+        # Number of rounds of querying all nameservers
+        self.retries = retries
+        self.cache_size = cache_size
+        # Cap on TTL of cached entries (s)
+        self.max_ttl = max_ttl
+        # (host, is_ipv6) -> [addr, expiry ticks, last use]
+        self.cache = {}
+        self.use_cnt = 0
+        # (host, is_ipv6) -> _Lookup
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.queries = 0
+
+    def _cache_put(self, key, addr, ttl):
+        cache = self.cache
+        now = utime.ticks_ms()
+        if key not in cache and len(cache) >= self.cache_size:
+            # Evict expired entries, or else least recently used one
+            lru = None
+            for k, e in list(cache.items()):
+                if utime.ticks_diff(e[1], now) <= 0:
+                    del cache[k]
+                elif lru is None or e[2] < cache[lru][2]:
+                    lru = k
+            if len(cache) >= self.cache_size:
+                del cache[lru]
+        self.use_cnt += 1
+        cache[key] = [addr, utime.ticks_add(now, min(ttl, self.max_ttl) * 1000), self.use_cnt]
+
+    def resolve(self, host, is_ipv6=False):
+        # Resolve host to a binary IPv4 (or IPv6) address, as returned
+        # by usocket.inet_pton(). Raises OSError if there's no address.
+        key = (host, is_ipv6)
+        e = self.cache.get(key)
+        if e:
+            if utime.ticks_diff(e[1], utime.ticks_ms()) > 0:
+                self.hits += 1
+                self.use_cnt += 1
+                e[2] = self.use_cnt
+                return e[0]
+            del self.cache[key]
+
+        l = self.pending.get(key)
+        if l:
+            if DEBUG and __debug__:
+                log.debug("Waiting for lookup of %s in progress", key)
+            self.coalesced += 1
+            task = core.get_event_loop().cur_task
+            l.waiters.append(task)
+            try:
+                yield from core.suspend()
+            finally:
+                if task in l.waiters:
+                    l.waiters.remove(task)
+            if l.exc:
+                raise l.exc
+            if l.res is None:
+                # Lookup was cancelled, do it ourselves
+                return (yield from self.resolve(host, is_ipv6))
+            return l.res
+
+        self.misses += 1
+        l = self.pending[key] = _Lookup()
+        try:
+            addr, ttl = yield from self._query(host, is_ipv6)
+            if ttl:
+                self._cache_put(key, addr, ttl)
+            l.res = addr
+            return addr
+        except OSError as e:
+            l.exc = e
+            raise
+        finally:
+            del self.pending[key]
+            for t in l.waiters:
+                core.resume(t)
+            l.waiters = []
+
+    def _query(self, host, is_ipv6):
+        qid = urandom.getrandbits(16)
+        buf = uio.BytesIO(len(host) + 18)
+        udnspkt.make_req(buf, host, is_ipv6, qid)
+        req = buf.getvalue()
+        for i in range(self.retries):
+            for ns in self.nameservers:
+                self.queries += 1
+                if DEBUG and __debug__:
+                    log.debug("Querying %s for %s", ns[-1], host)
+                s = uasyncio.udp.socket(ns[0])
+                try:
+                    yield from uasyncio.udp.sendto(s, req, ns[-1])
+                    resp = yield from core.wait_for_ms(uasyncio.udp.recv(s, 512), self.timeout)
+                except core.TimeoutError:
+                    # recv() already unregistered the socket
+                    s.close()
+                    continue
+                except:
+                    s.close()
+                    raise
+                yield from uasyncio.udp.close(s)
+                try:
+                    rid, rcode, answers = udnspkt.parse_answers(uio.BytesIO(resp), is_ipv6)
+                except Exception:
+                    # Junk or truncated response
+                    continue
+                if rid != qid:
+                    continue
+                if rcode == 3:
+                    raise OSError("DNS: %s: no such name" % host)
+                if rcode:
+                    # Server failure, etc., try next one
+                    continue
+                if not answers:
+                    raise OSError("DNS: %s: no address" % host)
+                # Cache for the minimal TTL among answers
+                ttl = answers[0][1]
+                for a in answers:
+                    if a[1] < ttl:
+                        ttl = a[1]
+                return answers[0][0], ttl
+        raise OSError("DNS: %s: no response" % host)
+
+    def getaddrinfo(self, host, port, af=0, type=usocket.SOCK_STREAM):
+        # Coroutine version of usocket.getaddrinfo(). The lookup is done
+        # by resolve(), and numeric address is then passed to
+        # usocket.getaddrinfo(), which doesn't block in this case.
+        if host != "localhost" and not _is_numeric(host):
+            is_ipv6 = af == usocket.AF_INET6
+            addr = yield from self.resolve(host, is_ipv6)
+            host = usocket.inet_ntop(usocket.AF_INET6 if is_ipv6 else usocket.AF_INET, addr)
+        return usocket.getaddrinfo(host, port, af, type)
+
+
+_resolver = None
+
+def get_resolver():
+    global _resolver
+    if _resolver is None:
+        _resolver = Resolver()
+    return _resolver
+
+def resolve(host, is_ipv6=False):
+    return get_resolver().resolve(host, is_ipv6)
+
+def getaddrinfo(host, port, af=0, type=usocket.SOCK_STREAM):
+    return get_resolver().getaddrinfo(host, port, af, type)
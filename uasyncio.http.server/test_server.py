@@ -0,0 +1,135 @@
+import utime
+import uasyncio
+from uasyncio.http.server import HTTPServer
+
+
+PORT = 8084
+
+app = HTTPServer(max_header=512, max_body=64)
+
+
+@app.route("/hello")
+def hello(req, resp):
+    yield from resp.send("Hello " + req.qs)
+
+
+@app.route("/echo", methods=("POST",))
+def echo(req, resp):
+    body = yield from req.read()
+    yield from resp.send(body, content_type="application/octet-stream")
+
+
+@app.route("/stream/*")
+def stream(req, resp):
+    resp.start()
+    for p in req.path.split("/")[2:]:
+        resp.write(p)
+    yield from resp.end()
+
+
+def read_response(r):
+    status = yield from r.readline()
+    headers = {}
+    while True:
+        l = yield from r.readline()
+        if l == b"\r\n":
+            break
+        k, v = l.split(b":", 1)
+        headers[k.lower()] = v.strip()
+    body = b""
+    if headers.get(b"transfer-encoding") == b"chunked":
+        while True:
+            n = int((yield from r.readline()), 16)
+            body += yield from r.readexactly(n + 2)
+            if not n:
+                break
+        body = body.replace(b"\r\n", b"")
+    elif b"content-length" in headers:
+        body = yield from r.readexactly(int(headers[b"content-length"]))
+    return int(status.split()[1]), headers, body
+
+
+def client():
+    r, w = yield from uasyncio.open_connection("127.0.0.1", PORT)
+    # Pipelined requests on a keep-alive connection, including one with
+    # chunked body, which the handler doesn't read
+    yield from w.awrite(b"GET /hello?x HTTP/1.1\r\nHost: a\r\n\r\n"
+        b"POST /echo HTTP/1.1\r\nContent-Length: 5\r\n\r\nabcde"
+        b"POST /echo HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n3\r\nabc\r\n2;x=y\r\nde\r\n0\r\n\r\n"
+        b"GET /stream/a/b/c HTTP/1.1\r\n\r\n"
+        b"GET /nope HTTP/1.1\r\n\r\n"
+        b"DELETE /hello HTTP/1.1\r\n\r\n"
+        b"GET /stream/x HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n1\r\nz\r\n0\r\n\r\n"
+        b"GET /hello HTTP/1.1\r\nConnection: close\r\n\r\n")
+    assert (yield from read_response(r)) == (200, {b"content-type": b"text/plain", b"content-length": b"7"}, b"Hello x")
+    assert (yield from read_response(r))[2] == b"abcde"
+    assert (yield from read_response(r))[2] == b"abcde"
+    res = yield from read_response(r)
+    assert res[0] == 200 and res[2] == b"abc", res
+    assert (yield from read_response(r))[0] == 404
+    res = yield from read_response(r)
+    assert res[0] == 405 and res[1][b"allow"] == b"GET", res
+    assert (yield from read_response(r))[2] == b"x"
+    res = yield from read_response(r)
+    assert res[1][b"connection"] == b"close", res
+    assert (yield from r.read()) == b""
+    yield from w.aclose()
+
+    # Bounded body and headers
+    for req, status in (
+        (b"POST /echo HTTP/1.1\r\nContent-Length: 65\r\n\r\n", 413),
+        (b"POST /echo HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n41\r\n" + b"x" * 65 + b"\r\n0\r\n\r\n", 413),
+        (b"GET /hello HTTP/1.1\r\nX: " + b"x" * 512 + b"\r\n\r\n", 431),
+        (b"GARBAGE\r\n\r\n", 400),
+    ):
+        r, w = yield from uasyncio.open_connection("127.0.0.1", PORT)
+        yield from w.awrite(req)
+        res = yield from read_response(r)
+        assert res[0] == status, (req, res)
+        assert res[1][b"connection"] == b"close"
+        yield from w.aclose()
+
+    # HTTP/1.0 keep-alive
+    r, w = yield from uasyncio.open_connection("127.0.0.1", PORT)
+    yield from w.awrite(b"GET /hello HTTP/1.0\r\nConnection: keep-alive\r\n\r\n")
+    res = yield from read_response(r)
+    assert res[1][b"connection"] == b"keep-alive", res
+    yield from w.awrite(b"GET /hello HTTP/1.0\r\n\r\n")
+    res = yield from read_response(r)
+    assert res[1][b"connection"] == b"close", res
+    yield from w.aclose()
+
+    assert app.requests == 11, app.requests
+
+    # More idle keep-alive connections than fixed-size waitq entries
+    conns = []
+    for i in range(20):
+        r, w = yield from uasyncio.open_connection("127.0.0.1", PORT)
+        yield from w.awrite(b"GET /hello?%d HTTP/1.1\r\n\r\n" % i)
+        assert (yield from read_response(r))[2] == b"Hello %d" % i
+        conns.append((r, w))
+    yield from uasyncio.sleep_ms(10)
+    for r, w in conns:
+        yield from w.awrite(b"GET /hello HTTP/1.1\r\nConnection: close\r\n\r\n")
+        assert (yield from read_response(r))[0] == 200
+        yield from w.aclose()
+
+    # Idle connection is closed after header_timeout
+    r, w = yield from uasyncio.open_connection("127.0.0.1", PORT + 6)
+    yield from w.awrite(b"GET /hello HTTP/1.1\r\n\r\n")
+    assert (yield from read_response(r))[0] == 200
+    t = utime.ticks_ms()
+    assert (yield from r.read()) == b""
+    t = utime.ticks_diff(utime.ticks_ms(), t)
+    assert 100 <= t < 400, t
+    yield from w.aclose()
+
+
+app2 = HTTPServer(header_timeout=100)
+app2.add_route("/hello", hello)
+
+loop = uasyncio.get_event_loop()
+loop.create_task(app.serve("127.0.0.1", PORT))
+loop.create_task(app2.serve("127.0.0.1", PORT + 6))
+loop.run_until_complete(client())
+print("OK")
@@ -0,0 +1,428 @@
+import utime
+import uasyncio
+
+
+DEBUG = 0
+log = None
+
+def set_debug(val):
+    global DEBUG, log
+    DEBUG = val
+    if val:
+        import logging
+        log = logging.getLogger("uasyncio.http.server")
+
+
+STATUS = {
+    200: "OK",
+    201: "Created",
+    204: "No Content",
+    301: "Moved Permanently",
+    302: "Found",
+    304: "Not Modified",
+    400: "Bad Request",
+    401: "Unauthorized",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    408: "Request Timeout",
+    413: "Payload Too Large",
+    431: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+    505: "HTTP Version Not Supported",
+}
+
+# Encoded status lines, built on first use
+_status_lines = {}
+
+
+def _status_line(status):
+    l = _status_lines.get(status)
+    if l is None:
+        l = ("HTTP/1.1 %d %s\r\n" % (status, STATUS.get(status, ""))).encode()
+        _status_lines[status] = l
+    return l
+
+
+class HTTPError(Exception):
+    # args: (status,)
+    pass
+
+
+def parse_headers(block, max_headers=32):
+    # Parse CRLF-separated header lines (without request/status line) into
+    # a dict with lowercased names. Repeated headers are joined with ", ".
+    headers = {}
+    for l in block.split(b"\r\n"):
+        if not l:
+            continue
+        i = l.find(b":")
+        if i <= 0:
+            raise HTTPError(400)
+        name = l[:i].strip().lower().decode()
+        val = l[i + 1:].strip().decode()
+        if name in headers:
+            headers[name] += ", " + val
+        else:
+            if len(headers) >= max_headers:
+                raise HTTPError(431)
+            headers[name] = val
+    return headers
+
+
+class Request:
+
+    def __init__(self, reader, method, path, qs, version, headers, max_body):
+        self.reader = reader
+        self.method = method
+        self.path = path
+        self.qs = qs
+        self.version = version
+        self.headers = headers
+        self.max_body = max_body
+        conn = headers.get("connection", "").lower()
+        if version == "HTTP/1.1":
+            self.keep_alive = "close" not in conn
+        else:
+            self.keep_alive = "keep-alive" in conn
+        self.chunked = "chunked" in headers.get("transfer-encoding", "").lower()
+        # Bytes remaining of the body, or of the current chunk
+        self.remain = 0
+        self.total = 0
+        self.eof = False
+        if not self.chunked:
+            try:
+                self.remain = int(headers.get("content-length", 0))
+            except ValueError:
+                raise HTTPError(400)
+            if self.remain < 0:
+                raise HTTPError(400)
+            if self.remain > max_body:
+                raise HTTPError(413)
+            self.eof = not self.remain
+
+    def _read_part(self, n):
+        # Read up to n (> 0) bytes of body, without crossing a chunk
+        # boundary. Returns b"" at the end of body.
+        r = self.reader
+        if not self.remain:
+            if self.eof:
+                return b""
+            # Next chunk
+            try:
+                l = yield from r.readuntil(b"\r\n", 64)
+                size = int(l.split(b";", 1)[0].strip(), 16)
+            except ValueError:
+                raise HTTPError(400)
+            if not size:
+                # Skip trailer
+                while True:
+                    l = yield from r.readuntil(b"\r\n", 1024)
+                    if l == b"\r\n" or not l:
+                        break
+                self.eof = True
+                return b""
+            self.total += size
+            if self.total > self.max_body:
+                raise HTTPError(413)
+            self.remain = size
+        if n > self.remain:
+            n = self.remain
+        data = yield from r.read(n)
+        if not data:
+            raise HTTPError(400)
+        self.remain -= len(data)
+        if not self.remain:
+            if self.chunked:
+                yield from r.readexactly(2)
+            else:
+                self.eof = True
+        return data
+
+    def read(self, n=-1):
+        # Read up to n bytes (all if n < 0) of request body, which may be
+        # sent chunked. Returns b"" at the end of body.
+        if n >= 0:
+            if not n:
+                return b""
+            return (yield from self._read_part(n))
+        if not self.chunked:
+            data = yield from self.reader.readexactly(self.remain)
+            if len(data) < self.remain:
+                raise HTTPError(400)
+            self.remain = 0
+            self.eof = True
+            return data
+        parts = []
+        while True:
+            data = yield from self._read_part(self.max_body)
+            if not data:
+                break
+            parts.append(data)
+        return b"".join(parts)
+
+    def _discard(self):
+        # Skip the rest of body not read by the handler
+        while not self.eof:
+            yield from self._read_part(512)
+
+    def __repr__(self):
+        return "<Request %s %s>" % (self.method, self.path)
+
+
+class Response:
+    # Response headers and body are written with buffered
+    # StreamWriter.write(), so (unless a lot of data is written) they go
+    # out in a single syscall. Responses to pipelined requests are
+    # coalesced the same way.
+
+    def __init__(self, writer, req):
+        self.w = writer
+        self.keep_alive = req.keep_alive
+        self.http11 = req.version == "HTTP/1.1"
+        self.started = False
+        self.chunked = False
+        self.finished = False
+
+    def start(self, status=200, content_type="text/plain", headers=None, length=-1):
+        # Not a coroutine. If length is negative, body is sent chunked (or
+        # to HTTP/1.0 clients, until connection is closed).
+        assert not self.started
+        self.started = True
+        w = self.w
+        w.write(_status_line(status))
+        if content_type:
+            w.write(b"Content-Type: %s\r\n" % content_type.encode())
+        if length >= 0:
+            w.write(b"Content-Length: %d\r\n" % length)
+        elif self.http11:
+            w.write(b"Transfer-Encoding: chunked\r\n")
+            self.chunked = True
+        else:
+            self.keep_alive = False
+        if headers:
+            for k, v in headers.items():
+                w.write(("%s: %s\r\n" % (k, v)).encode())
+        if not self.keep_alive:
+            w.write(b"Connection: close\r\n\r\n")
+        elif not self.http11:
+            w.write(b"Connection: keep-alive\r\n\r\n")
+        else:
+            w.write(b"\r\n")
+
+    def write(self, data):
+        # Not a coroutine, use drain() for flow control
+        if isinstance(data, str):
+            data = data.encode()
+        if self.chunked:
+            if not data:
+                return
+            self.w.write(b"%x\r\n" % len(data))
+            self.w.write(data)
+            self.w.write(b"\r\n")
+        else:
+            self.w.write(data)
+
+    def drain(self):
+        yield from self.w.drain()
+
+    def end(self):
+        if not self.started:
+            self.start(length=0)
+        if self.chunked:
+            self.w.write(b"0\r\n\r\n")
+        self.finished = True
+        yield from self.w.drain()
+
+    def send(self, body, status=200, content_type="text/plain", headers=None):
+        # Send complete response
+        if isinstance(body, str):
+            body = body.encode()
+        self.start(status, content_type, headers, len(body))
+        self.w.write(body)
+        self.finished = True
+        yield from self.w.drain()
+
+
+class HTTPServer:
+    # Routes are looked up by exact path, then by prefix (routes ending
+    # with "*"), in the order they were added. A handler is a coroutine
+    # called with (request, response).
+
+    def __init__(self, max_header=2048, max_headers=32, max_body=16384, header_timeout=10000):
+        # Limits on size of request line with headers, number of headers
+        # and body size
+        self.max_header = max_header
+        self.max_headers = max_headers
+        self.max_body = max_body
+        # Time (ms) to wait for headers of a request, including idle time
+        # of a keep-alive connection
+        self.header_timeout = header_timeout
+        # Tasks of connections waiting for headers: deadline. Instead of
+        # a timer per connection (which would exhaust a fixed-size waitq
+        # with as many idle keep-alive connections), they're checked by
+        # a single task, while there're any.
+        self.waiting = {}
+        self.reaping = False
+        # path: {method: handler}
+        self.routes = {}
+        # [(prefix, {method: handler})]
+        self.prefixes = []
+        # Counters
+        self.conns = 0
+        self.requests = 0
+        self.errors = 0
+
+    def add_route(self, path, handler, methods=("GET",)):
+        if path.endswith("*"):
+            path = path[:-1]
+            for p, table in self.prefixes:
+                if p == path:
+                    break
+            else:
+                table = {}
+                self.prefixes.append((path, table))
+        else:
+            table = self.routes.setdefault(path, {})
+        for m in methods:
+            table[m] = handler
+
+    def route(self, path, methods=("GET",)):
+        # Decorator version of add_route()
+        def _route(f):
+            self.add_route(path, f, methods)
+            return f
+        return _route
+
+    def _find(self, path):
+        table = self.routes.get(path)
+        if table is None:
+            for p, t in self.prefixes:
+                if path.startswith(p):
+                    return t
+        return table
+
+    def _reaper(self):
+        # Cancel connections waiting for headers past their deadline with
+        # TimeoutError, checking every quarter of header_timeout
+        loop = uasyncio.get_event_loop()
+        waiting = self.waiting
+        delay = self.header_timeout // 4 or 1
+        while waiting:
+            yield from uasyncio.sleep_ms(delay)
+            now = utime.ticks_ms()
+            delay = self.header_timeout // 4 or 1
+            for task, deadline in list(waiting.items()):
+                if utime.ticks_diff(now, deadline) < 0:
+                    continue
+                if not loop.runq_grow and len(loop.runq) >= loop.runq_len // 2:
+                    # Leave runq room for others, continue soon
+                    delay = 1
+                    break
+                del waiting[task]
+                if DEBUG and __debug__:
+                    log.debug("Header timeout: %s", task)
+                if task.pend_throw(uasyncio.TimeoutError()) is False:
+                    loop.call_soon(task)
+        self.reaping = False
+
+    def _read_request(self, reader):
+        # Returns Request, or None if connection was closed
+        task = None
+        if self.header_timeout:
+            task = uasyncio.get_event_loop().cur_task
+            self.waiting[task] = utime.ticks_add(utime.ticks_ms(), self.header_timeout)
+            if not self.reaping:
+                self.reaping = True
+                uasyncio.get_event_loop().create_task(self._reaper())
+        try:
+            block = yield from reader.readuntil(b"\r\n\r\n", self.max_header)
+        except ValueError:
+            raise HTTPError(431)
+        finally:
+            if task:
+                self.waiting.pop(task, None)
+        # Empty lines before request line are allowed
+        while block.startswith(b"\r\n"):
+            block = block[2:]
+        if not block:
+            return None
+        if not block.endswith(b"\r\n\r\n"):
+            # Closed in the middle of request
+            raise HTTPError(400)
+        i = block.find(b"\r\n")
+        l = block[:i].split()
+        if len(l) != 3:
+            raise HTTPError(400)
+        version = l[2].decode()
+        if version != "HTTP/1.1" and version != "HTTP/1.0":
+            raise HTTPError(505)
+        path = l[1].decode()
+        qs = ""
+        q = path.find("?")
+        if q >= 0:
+            qs = path[q + 1:]
+            path = path[:q]
+        headers = parse_headers(block[i + 2:], self.max_headers)
+        return Request(reader, l[0].decode(), path, qs, version, headers, self.max_body)
+
+    def _handle(self, reader, writer):
+        self.conns += 1
+        try:
+            while True:
+                resp = None
+                try:
+                    req = yield from self._read_request(reader)
+                    if req is None:
+                        break
+                    self.requests += 1
+                    if DEBUG and __debug__:
+                        log.debug("%s", req)
+                    resp = Response(writer, req)
+                    table = self._find(req.path)
+                    if table is None:
+                        yield from resp.send(b"", 404)
+                    else:
+                        h = table.get(req.method)
+                        if h is None:
+                            yield from resp.send(b"", 405, headers={"Allow": ", ".join(table)})
+                        else:
+                            yield from h(req, resp)
+                            if not resp.finished:
+                                yield from resp.end()
+                    if not resp.keep_alive:
+                        break
+                    yield from req._discard()
+                except HTTPError as e:
+                    self.errors += 1
+                    if not resp or not resp.started:
+                        writer.write(_status_line(e.args[0]))
+                        writer.write(b"Content-Length: 0\r\nConnection: close\r\n\r\n")
+                        yield from writer.drain()
+                    break
+                except uasyncio.CancelledError:
+                    # Including TimeoutError on waiting for headers
+                    raise
+                except Exception as e:
+                    self.errors += 1
+                    if DEBUG and __debug__:
+                        log.warning("Error handling %s: %r", resp and req, e)
+                    if not isinstance(e, OSError) and (not resp or not resp.started):
+                        writer.write(_status_line(500))
+                        writer.write(b"Content-Length: 0\r\nConnection: close\r\n\r\n")
+                        yield from writer.drain()
+                    break
+        except uasyncio.TimeoutError:
+            pass
+        finally:
+            self.conns -= 1
+            try:
+                yield from writer.aclose()
+            except OSError:
+                pass
+
+    def serve(self, host="0.0.0.0", port=80, backlog=10, max_conns=0, reuseport=False, ssl=None):
+        # Returns server coroutine, to be scheduled with loop.create_task().
+        # See uasyncio.start_server() for params.
+        return uasyncio.start_server(self._handle, host, port, backlog, max_conns, reuseport, ssl)
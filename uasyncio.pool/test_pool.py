@@ -0,0 +1,82 @@
+import uasyncio
+from uasyncio.pool import ConnectionPool
+
+
+ADDR = ("127.0.0.1", 8081)
+
+
+def server(reader, writer):
+    while True:
+        l = yield from reader.readline()
+        if not l or l == b"bye\n":
+            break
+        yield from writer.awrite(l)
+    yield from reader.aclose()
+    yield from writer.aclose()
+
+
+def request(pool, line, hold=0):
+    reader, writer = yield from pool.open_connection(*ADDR)
+    yield from writer.awrite(line)
+    res = yield from reader.readline()
+    yield from uasyncio.sleep_ms(hold)
+    pool.release(reader, writer)
+    return res
+
+
+def main(pool):
+    yield from uasyncio.sleep_ms(10)
+    for i in range(3):
+        assert (yield from request(pool, b"ping\n")) == b"ping\n"
+    assert pool.hits == 2 and pool.misses == 1, pool.stats()
+
+    # Connection closed by server fails health check on checkout
+    reader, writer = yield from pool.open_connection(*ADDR)
+    yield from writer.awrite(b"bye\n")
+    pool.release(reader, writer)
+    yield from uasyncio.sleep_ms(10)
+    assert (yield from request(pool, b"ping\n")) == b"ping\n"
+    assert pool.broken == 1 and pool.misses == 2, pool.stats()
+
+    # Over max_per_host, requests wait for a connection to be released
+    res = []
+    def req(line):
+        res.append((yield from request(pool, line, 10)))
+    loop = uasyncio.get_event_loop()
+    loop.create_task(req(b"1\n"))
+    loop.create_task(req(b"2\n"))
+    loop.create_task(req(b"3\n"))
+    while len(res) < 3:
+        yield from uasyncio.sleep_ms(10)
+    assert sorted(res) == [b"1\n", b"2\n", b"3\n"]
+    st = pool.stats()
+    assert st["open"] == 2 and st["waits"] == 1, st
+
+    pool.idle_timeout = 0
+    yield from uasyncio.sleep_ms(10)
+    pool.prune()
+    st = pool.stats()
+    assert st["open"] == 0 and st["expired"] == 2, st
+
+
+class MockStream:
+
+    def __init__(self, data):
+        self.data = data
+
+    def read(self, n):
+        assert self.data != "ciphertext", "TLS socket read directly"
+        return self.data
+
+
+# Idle TLS connection with session ticket pending on the socket, and
+# without application data
+reader = uasyncio.StreamReader(MockStream("ciphertext"), MockStream(None))
+assert ConnectionPool._healthy(reader)
+reader = uasyncio.StreamReader(MockStream("ciphertext"), MockStream(b""))
+assert not ConnectionPool._healthy(reader)
+
+loop = uasyncio.get_event_loop()
+loop.create_task(uasyncio.start_server(server, *ADDR))
+loop.run_until_complete(main(ConnectionPool(max_per_host=2)))
+print("OK")
@@ -0,0 +1,162 @@
+import utime
+import uasyncio
+from uasyncio import core
+
+
+DEBUG = 0
+log = None
+
+def set_debug(val):
+    global DEBUG, log
+    DEBUG = val
+    if val:
+        import logging
+        log = logging.getLogger("uasyncio.pool")
+
+
+class ConnectionPool:
+    # Pool of keep-alive connections, keyed by (host, port, ssl). Usage:
+    #
+    # reader, writer = await pool.open_connection(host, port)
+    # ... request/response exchange ...
+    # pool.release(reader, writer)
+    #
+    # Connection should be released with reuse=False (or just closed)
+    # if the exchange failed or left it in an unknown state.
+
+    def __init__(self, max_per_host=4, idle_timeout=30000):
+        # Max number of connections (both checked out and idle) per key,
+        # callers wait for one to be released above that.
+        self.max_per_host = max_per_host
+        # Idle connections older than this (ms) are closed on checkout
+        # or by prune().
+        self.idle_timeout = idle_timeout
+        # key -> list of [reader, writer, release time], most recently
+        # released last.
+        self.idle = {}
+        # key -> number of open connections
+        self.count = {}
+        # key -> list of tasks waiting for a connection slot
+        self.waiters = {}
+        # id(writer) -> key for checked out connections
+        self.keys = {}
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.broken = 0
+        self.waits = 0
+
+    def stats(self):
+        return {
+            "hits": self.hits, "misses": self.misses,
+            "expired": self.expired, "broken": self.broken,
+            "waits": self.waits,
+            "open": sum(self.count.values()),
+            "idle": sum([len(l) for l in self.idle.values()]),
+        }
+
+    @staticmethod
+    def _healthy(reader):
+        # Idle connection must have nothing to read: neither data (which
+        # would mean protocol desync) nor EOF (closed by peer). TLS
+        # connections are probed through the TLS stream: reading the
+        # socket would consume ciphertext (e.g. TLS 1.3 session tickets,
+        # which arrive on idle connections).
+        if reader.buf:
+            return False
+        try:
+            return reader.ios.read(1) is None
+        except OSError:
+            return False
+
+    def open_connection(self, host, port, ssl=False):
+        key = (host, port, ssl)
+        loop = core.get_event_loop()
+        while True:
+            idle = self.idle.get(key)
+            while idle:
+                e = idle.pop()
+                if utime.ticks_diff(loop.time(), e[2]) > self.idle_timeout:
+                    self.expired += 1
+                    self._close(key, e[0], e[1])
+                    continue
+                if not self._healthy(e[0]):
+                    self.broken += 1
+                    self._close(key, e[0], e[1])
+                    continue
+                self.hits += 1
+                if DEBUG and __debug__:
+                    log.debug("Reusing connection to %s", key)
+                self.keys[id(e[1])] = key
+                return e[0], e[1]
+
+            n = self.count.get(key, 0)
+            if n < self.max_per_host:
+                self.count[key] = n + 1
+                self.misses += 1
+                if DEBUG and __debug__:
+                    log.debug("New connection to %s", key)
+                try:
+                    reader, writer = yield from uasyncio.open_connection(host, port, ssl)
+                except:
+                    self._dec(key)
+                    raise
+                self.keys[id(writer)] = key
+                return reader, writer
+
+            if DEBUG and __debug__:
+                log.debug("Waiting for connection to %s", key)
+            self.waits += 1
+            task = loop.cur_task
+            waiters = self.waiters.setdefault(key, [])
+            waiters.append(task)
+            try:
+                yield from core.suspend()
+            finally:
+                # If we were cancelled instead of woken up
+                if task in waiters:
+                    waiters.remove(task)
+
+    def release(self, reader, writer, reuse=True):
+        # Return connection to the pool. Not a coroutine.
+        key = self.keys.pop(id(writer))
+        if reuse and not writer.error:
+            self.idle.setdefault(key, []).append([reader, writer, core.get_event_loop().time()])
+            self._wake(key)
+        else:
+            self._close(key, reader, writer)
+
+    def prune(self):
+        # Close expired idle connections, may be called periodically
+        now = core.get_event_loop().time()
+        for key, idle in self.idle.items():
+            # Oldest ones are first
+            while idle and utime.ticks_diff(now, idle[0][2]) > self.idle_timeout:
+                e = idle.pop(0)
+                self.expired += 1
+                self._close(key, e[0], e[1])
+
+    def close(self):
+        # Close all idle connections
+        for key, idle in self.idle.items():
+            while idle:
+                e = idle.pop()
+                self._close(key, e[0], e[1])
+
+    def _close(self, key, reader, writer):
+        if DEBUG and __debug__:
+            log.debug("Closing connection to %s", key)
+        # aclose() unregisters the stream from the poller
+        core.get_event_loop().create_task(writer.aclose())
+        self._dec(key)
+
+    def _dec(self, key):
+        self.count[key] -= 1
+        self._wake(key)
+
+    def _wake(self, key):
+        # Waiters cancelled meanwhile are skipped
+        waiters = self.waiters.get(key)
+        while waiters:
+            if core.resume(waiters.pop(0)):
+                break
@@ -7,7 +7,7 @@ sys.path.append("..")
 import sdist_upip
 
 setup(name='micropython-uasyncio.queues',
-      version='0.1.2',
+      version='0.2',
       description='uasyncio.queues module for MicroPython',
       long_description='Port of asyncio.queues to uasyncio.',
       url='https://github.com/micropython/micropython-lib',
@@ -18,4 +18,4 @@ setup(name='micropython-uasyncio.queues',
       license='MIT',
       cmdclass={'sdist': sdist_upip.sdist},
       packages=['uasyncio'],
-      install_requires=['micropython-uasyncio.core', 'micropython-collections.deque'])
+      install_requires=['micropython-uasyncio.core>=2.1', 'micropython-collections.deque', 'micropython-heapq'])
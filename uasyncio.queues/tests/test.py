@@ -2,6 +2,7 @@ from unittest import TestCase, run_class
 import sys
 sys.path.insert(0, '../uasyncio')
 import queues
+import uasyncio.core
 
 
 class QueueTestCase(TestCase):
@@ -52,6 +53,78 @@ class QueueTestCase(TestCase):
         q.put_nowait(10)
         self.assertTrue(q.full())
 
+    def test_priority(self):
+        q = queues.PriorityQueue()
+        for v in (3, 1, 2):
+            q.put_nowait(v)
+        self.assertEqual([q.get_nowait() for i in range(3)], [1, 2, 3])
+
+    def test_lifo(self):
+        q = queues.LifoQueue()
+        for v in (1, 2, 3):
+            q.put_nowait(v)
+        self.assertEqual([q.get_nowait() for i in range(3)], [3, 2, 1])
+
+    def test_handoff(self):
+        # Blocked getters and putters are woken up directly, without
+        # polling with a delay.
+        q = queues.Queue(maxsize=1)
+        res = []
+        loop = uasyncio.core.get_event_loop()
+
+        def consumer():
+            for i in range(5):
+                res.append((yield from q.get()))
+                q.task_done()
+
+        def producer():
+            for i in range(5):
+                yield from q.put(i)
+            yield from q.join()
+            res.append("joined")
+
+        loop.create_task(consumer())
+        t = loop.time()
+        loop.run_until_complete(producer())
+        self.assertEqual(res, [0, 1, 2, 3, 4, "joined"])
+        self.assertTrue(uasyncio.core.time.ticks_diff(loop.time(), t) < 50)
+
+    def test_cancelled_getter(self):
+        # Getter cancelled, but not yet run when an item is put, doesn't
+        # get it, and the item goes to the next getter.
+        q = queues.Queue()
+        res = []
+        loop = uasyncio.core.get_event_loop()
+
+        def consumer(name):
+            try:
+                res.append((name, (yield from q.get())))
+            except uasyncio.core.CancelledError:
+                res.append((name, "cancelled"))
+
+        def main():
+            c1 = consumer(1)
+            loop.create_task(c1)
+            loop.create_task(consumer(2))
+            yield from uasyncio.core.sleep_ms(10)
+            uasyncio.core.cancel(c1)
+            q.put_nowait("item")
+            yield from uasyncio.core.sleep_ms(10)
+
+        loop.run_until_complete(main())
+        self.assertEqual(sorted(res, key=lambda r: r[0]), [(1, "cancelled"), (2, "item")])
+
+    def test_task_done(self):
+        q = queues.Queue()
+        q.put_nowait(1)
+        q.get_nowait()
+        q.task_done()
+        try:
+            q.task_done()
+            self.assertTrue(False)
+        except ValueError:
+            pass
+
 
 if __name__ == '__main__':
     run_class(QueueTestCase)
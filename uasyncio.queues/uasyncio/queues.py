@@ -1,5 +1,6 @@
 from collections.deque import deque
-from uasyncio.core import sleep
+import heapq
+from uasyncio.core import get_event_loop, suspend, resume
 
 
 class QueueEmpty(Exception):
@@ -20,16 +21,51 @@ class Queue:
     Unlike the standard library Queue, you can reliably know this Queue's size
     with qsize(), since your single-threaded uasyncio application won't be
     interrupted between calling qsize() and doing an operation on the Queue.
+
+    Coroutines blocked in get()/put()/join() wait without polling, and are
+    scheduled to run as soon as the queue state changes.
     """
-    _attempt_delay = 0.1
 
     def __init__(self, maxsize=0):
         self.maxsize = maxsize
+        self._init()
+        # Tasks waiting for an item, for a free slot, and for all items
+        # to be processed, respectively.
+        self._getters = []
+        self._putters = []
+        self._joiners = []
+        self._unfinished = 0
+
+    def _init(self):
         self._queue = deque()
 
     def _get(self):
         return self._queue.popleft()
 
+    @staticmethod
+    def _wait(waiters):
+        task = get_event_loop().cur_task
+        waiters.append(task)
+        try:
+            yield from suspend()
+        except:
+            if task in waiters:
+                waiters.remove(task)
+            else:
+                # We were woken up, but won't act on it, so pass wakeup
+                # on to the next waiter.
+                Queue._wakeup(waiters)
+            raise
+
+    @staticmethod
+    def _wakeup(waiters):
+        # Waiters cancelled meanwhile are skipped (and left for their
+        # _wait() to remove), so the wakeup goes to a live one.
+        for task in waiters:
+            if resume(task):
+                waiters.remove(task)
+                return
+
     def get(self):
         """Returns generator, which can be used for getting (and removing)
         an item from a queue.
@@ -39,8 +75,10 @@ class Queue:
             item = yield from queue.get()
         """
         while not self._queue:
-            yield from sleep(self._attempt_delay)
-        return self._get()
+            yield from self._wait(self._getters)
+        val = self._get()
+        self._wakeup(self._putters)
+        return val
 
     def get_nowait(self):
         """Remove and return an item from the queue.
@@ -49,11 +87,18 @@ class Queue:
         """
         if not self._queue:
             raise QueueEmpty()
-        return self._get()
+        val = self._get()
+        self._wakeup(self._putters)
+        return val
 
     def _put(self, val):
         self._queue.append(val)
 
+    def _put_wakeup(self, val):
+        self._put(val)
+        self._unfinished += 1
+        self._wakeup(self._getters)
+
     def put(self, val):
         """Returns generator which can be used for putting item in a queue.
 
@@ -62,8 +107,8 @@ class Queue:
             yield from queue.put(item)
         """
         while self.qsize() >= self.maxsize and self.maxsize:
-            yield from sleep(self._attempt_delay)
-        self._put(val)
+            yield from self._wait(self._putters)
+        self._put_wakeup(val)
 
     def put_nowait(self, val):
         """Put an item into the queue without blocking.
@@ -72,7 +117,7 @@ class Queue:
         """
         if self.qsize() >= self.maxsize and self.maxsize:
             raise QueueFull()
-        self._put(val)
+        self._put_wakeup(val)
 
     def qsize(self):
         """Number of items in the queue."""
@@ -92,3 +137,59 @@ class Queue:
             return False
         else:
             return self.qsize() >= self.maxsize
+
+    def task_done(self):
+        """Indicate that a formerly enqueued item is processed.
+
+        Used by consumers. For each get(), a subsequent call to task_done()
+        tells the queue that processing of the item is complete. Raises
+        ValueError if called more times than there were items put.
+        """
+        if self._unfinished <= 0:
+            raise ValueError("task_done() called too many times")
+        self._unfinished -= 1
+        if not self._unfinished:
+            joiners = self._joiners
+            while joiners:
+                resume(joiners.pop())
+
+    def join(self):
+        """Returns generator, which waits until all items in the queue have
+        been gotten and processed (see task_done()).
+
+        Usage::
+
+            yield from queue.join()
+        """
+        while self._unfinished:
+            yield from self._wait(self._joiners)
+
+
+class PriorityQueue(Queue):
+    """A subclass of Queue, retrieving entries in priority order (lowest
+    first).
+
+    Entries are typically tuples of the form: (priority number, data).
+    """
+
+    def _init(self):
+        self._queue = []
+
+    def _put(self, val):
+        heapq.heappush(self._queue, val)
+
+    def _get(self):
+        return heapq.heappop(self._queue)
+
+
+class LifoQueue(Queue):
+    """A subclass of Queue, retrieving most recently added entries first."""
+
+    def _init(self):
+        self._queue = []
+
+    def _put(self, val):
+        self._queue.append(val)
+
+    def _get(self):
+        return self._queue.pop()
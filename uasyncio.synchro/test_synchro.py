@@ -0,0 +1,199 @@
+import uasyncio.core as asyncio
+from uasyncio.synchro import Lock, Event, Semaphore, BoundedSemaphore, Condition, RWLock
+
+
+loop = asyncio.get_event_loop()
+log = []
+
+
+def run(*coros):
+    for c in coros[:-1]:
+        loop.create_task(c)
+    loop.run_until_complete(coros[-1])
+
+
+# Uncontended Lock is acquired without yielding
+lock = Lock()
+g = lock.acquire()
+try:
+    next(g)
+    assert False
+except StopIteration:
+    pass
+assert lock.locked
+lock.release()
+
+
+# Waiters are served in FIFO order, lock is handed over on release
+def locker(i):
+    yield from lock.acquire()
+    log.append(i)
+    yield from asyncio.sleep_ms(1)
+    lock.release()
+
+def waiter():
+    yield from asyncio.sleep_ms(20)
+
+run(locker(1), locker(2), locker(3), waiter())
+assert log == [1, 2, 3], log
+assert not lock.locked
+
+
+# Cancelled waiter doesn't get the lock, and doesn't block others
+log = []
+def holder():
+    yield from lock.acquire()
+    yield from asyncio.sleep_ms(10)
+    lock.release()
+
+def cancelled():
+    try:
+        yield from lock.acquire()
+        log.append("acquired")
+    except asyncio.CancelledError:
+        log.append("cancelled")
+
+c = cancelled()
+def canceller():
+    yield from asyncio.sleep_ms(1)
+    asyncio.cancel(c)
+    yield from asyncio.sleep_ms(20)
+
+run(holder(), c, locker(4), canceller())
+assert log == ["cancelled", 4], log
+assert not lock.locked
+
+
+# Lock released right after cancelling a waiter (before it runs) goes to
+# the next waiter, and the cancelled one isn't resumed twice
+log = []
+def cancelled2():
+    try:
+        yield from lock.acquire()
+        log.append("acquired")
+    except asyncio.CancelledError:
+        log.append("cancelled")
+    t = loop.time()
+    yield from asyncio.sleep_ms(50)
+    log.append(asyncio.time.ticks_diff(loop.time(), t) >= 50)
+
+c = cancelled2()
+def cancel_release():
+    yield from lock.acquire()
+    yield from asyncio.sleep_ms(1)
+    asyncio.cancel(c)
+    lock.release()
+
+def waiter2():
+    yield from asyncio.sleep_ms(80)
+
+run(cancel_release(), c, locker(5), waiter2())
+assert log == ["cancelled", 5, True], log
+assert not lock.locked
+
+# Same for Semaphore
+log = []
+sem = Semaphore(0)
+def sem_waiter(i):
+    try:
+        yield from sem.acquire()
+        log.append(i)
+    except asyncio.CancelledError:
+        log.append("cancelled")
+
+c = sem_waiter(1)
+def sem_releaser():
+    yield from asyncio.sleep_ms(1)
+    asyncio.cancel(c)
+    sem.release()
+    yield from asyncio.sleep_ms(10)
+
+run(c, sem_waiter(2), sem_releaser())
+assert log == ["cancelled", 2], log
+assert sem.value == 0 and not sem.waiters
+
+
+# Semaphore limits concurrency
+log = []
+sem = BoundedSemaphore(2)
+active = [0, 0]
+def limited(i):
+    yield from sem.acquire()
+    active[0] += 1
+    active[1] = max(active)
+    yield from asyncio.sleep_ms(5)
+    active[0] -= 1
+    sem.release()
+    log.append(i)
+
+run(*[limited(i) for i in range(5)] + [waiter()])
+assert sorted(log) == [0, 1, 2, 3, 4] and active[1] == 2, (log, active)
+try:
+    sem.release()
+    assert False
+except ValueError:
+    pass
+
+
+# Event wakes all waiters
+log = []
+ev = Event()
+def ev_waiter(i):
+    yield from ev.wait()
+    log.append(i)
+
+def ev_setter():
+    yield from asyncio.sleep_ms(5)
+    assert not log
+    ev.set()
+    yield from asyncio.sleep_ms(5)
+
+run(ev_waiter(1), ev_waiter(2), ev_setter())
+assert log == [1, 2], log
+
+
+# Condition
+log = []
+cond = Condition()
+items = []
+def consumer():
+    yield from cond.acquire()
+    yield from cond.wait_for(lambda: items)
+    log.append(items.pop())
+    cond.release()
+
+def producer():
+    yield from asyncio.sleep_ms(5)
+    yield from cond.acquire()
+    items.append("item")
+    cond.notify()
+    cond.release()
+    yield from asyncio.sleep_ms(5)
+
+run(consumer(), producer())
+assert log == ["item"], log
+
+
+# RWLock: readers share the lock, writer is exclusive, and readers
+# arriving while a writer waits are queued after it.
+log = []
+rw = RWLock()
+def reader(i, delay):
+    yield from asyncio.sleep_ms(delay)
+    yield from rw.acquire_read()
+    log.append(("r", i, rw.readers))
+    yield from asyncio.sleep_ms(5)
+    rw.release_read()
+
+def writer(delay):
+    yield from asyncio.sleep_ms(delay)
+    yield from rw.acquire_write()
+    log.append(("w", rw.readers))
+    yield from asyncio.sleep_ms(5)
+    rw.release_write()
+
+run(reader(1, 0), reader(2, 0), writer(1), reader(3, 2), waiter())
+assert log == [("r", 1, 1), ("r", 2, 2), ("w", 0), ("r", 3, 1)], log
+assert not rw.writer and not rw.readers
+
+print("OK")
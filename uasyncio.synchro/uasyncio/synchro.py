@@ -1,28 +1,222 @@
+import ucollections
 from uasyncio import core
 
+
+class _WaitQueue:
+    # FIFO of waiting tasks. All operations are O(1): instead of being
+    # removed, entries of tasks which stopped waiting (were cancelled) are
+    # marked as such (False), and skipped when woken up. Entry of a woken
+    # up task is set to None.
+
+    def __init__(self):
+        self.size = 4
+        self.q = ucollections.deque((), self.size, True)
+        # Number of live entries
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    def _grow(self):
+        old = self.q
+        self.size *= 2
+        q = ucollections.deque((), self.size, True)
+        while old:
+            q.append(old.popleft())
+        self.q = q
+
+    def wait(self, cancel_cb=None):
+        # Wait until woken up by wake(). If the task is cancelled after
+        # being woken up (e.g. while already handed over ownership of a
+        # lock), cancel_cb is called to pass it on.
+        task = core.get_event_loop().cur_task
+        e = [task]
+        try:
+            self.q.append(e)
+        except IndexError:
+            self._grow()
+            self.q.append(e)
+        self.n += 1
+        try:
+            yield from core.suspend()
+        except:
+            if e[0] is task:
+                e[0] = False
+                self.n -= 1
+            elif e[0] is None and cancel_cb:
+                cancel_cb()
+            raise
+
+    def wake(self):
+        # Wake up the first waiting task, return False if there's none
+        q = self.q
+        while q:
+            e = q.popleft()
+            task = e[0]
+            if task:
+                self.n -= 1
+                if core.resume(task):
+                    e[0] = None
+                    return True
+                # Cancelled, but didn't run yet
+                e[0] = False
+        return False
+
+    def wake_all(self):
+        while self.wake():
+            pass
+
+
 class Lock:
+    # Ownership is handed over to the first waiter on release(), so the
+    # lock is fair, and acquire() of a free lock doesn't need to yield.
 
     def __init__(self):
         self.locked = False
-        self.wlist = []
+        self.waiters = _WaitQueue()
 
     def release(self):
         assert self.locked
-        self.locked = False
-        if self.wlist:
-            #print(self.wlist)
-            coro = self.wlist.pop(0)
-            core.get_event_loop().call_soon(coro)
+        if not self.waiters.wake():
+            self.locked = False
+
+    def acquire(self):
+        if not self.locked:
+            self.locked = True
+            return True
+        yield from self.waiters.wait(self.release)
+        return True
+
+
+class Event:
+
+    def __init__(self):
+        self.state = False
+        self.waiters = _WaitQueue()
+
+    def is_set(self):
+        return self.state
+
+    def set(self):
+        self.state = True
+        self.waiters.wake_all()
+
+    def clear(self):
+        self.state = False
+
+    def wait(self):
+        if not self.state:
+            yield from self.waiters.wait()
+        return True
+
+
+class Semaphore:
+
+    def __init__(self, value=1):
+        assert value >= 0
+        self.value = value
+        self.waiters = _WaitQueue()
+
+    def release(self):
+        if not self.waiters.wake():
+            self.value += 1
 
     def acquire(self):
-        # As release() is not coro, assume we just released and going to acquire again
-        # so, yield first to let someone else to acquire it first
-        yield
-        #print("acquire:", self.locked)
-        while 1:
-            if not self.locked:
-                self.locked = True
-                return True
-            #print("putting", core.get_event_loop().cur_task, "on waiting list")
-            self.wlist.append(core.get_event_loop().cur_task)
-            yield False
+        if self.value:
+            self.value -= 1
+            return True
+        yield from self.waiters.wait(self.release)
+        return True
+
+
+class BoundedSemaphore(Semaphore):
+    # Raises ValueError if released more times than acquired
+
+    def __init__(self, value=1):
+        super().__init__(value)
+        self.bound = value
+
+    def release(self):
+        if self.value >= self.bound:
+            raise ValueError("BoundedSemaphore released too many times")
+        super().release()
+
+
+class Condition:
+
+    def __init__(self, lock=None):
+        if lock is None:
+            lock = Lock()
+        self.lock = lock
+        self.waiters = _WaitQueue()
+
+    def acquire(self):
+        return (yield from self.lock.acquire())
+
+    def release(self):
+        self.lock.release()
+
+    def wait(self):
+        # Must be called with the lock held, which is released while
+        # waiting for notify(), and reacquired afterwards.
+        self.lock.release()
+        try:
+            yield from self.waiters.wait(self.notify)
+        finally:
+            yield from self.lock.acquire()
+        return True
+
+    def wait_for(self, predicate):
+        res = predicate()
+        while not res:
+            yield from self.wait()
+            res = predicate()
+        return res
+
+    def notify(self, n=1):
+        while n and self.waiters.wake():
+            n -= 1
+
+    def notify_all(self):
+        self.waiters.wake_all()
+
+
+class RWLock:
+    # Reader-writer lock: any number of readers, or a single writer. New
+    # readers wait while a writer is waiting, and on writer's release,
+    # all waiting readers are let in, so neither side can starve.
+
+    def __init__(self):
+        self.readers = 0
+        self.writer = False
+        self.rwaiters = _WaitQueue()
+        self.wwaiters = _WaitQueue()
+
+    def acquire_read(self):
+        if not self.writer and not self.wwaiters:
+            self.readers += 1
+            return True
+        yield from self.rwaiters.wait(self.release_read)
+        return True
+
+    def release_read(self):
+        assert self.readers
+        self.readers -= 1
+        if not self.readers and self.wwaiters.wake():
+            self.writer = True
+
+    def acquire_write(self):
+        if not self.writer and not self.readers:
+            self.writer = True
+            return True
+        yield from self.wwaiters.wait(self.release_write)
+        return True
+
+    def release_write(self):
+        assert self.writer
+        if self.rwaiters:
+            self.writer = False
+            while self.rwaiters.wake():
+                self.readers += 1
+        elif not self.wwaiters.wake():
+            self.writer = False
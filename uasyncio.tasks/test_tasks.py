@@ -0,0 +1,68 @@
+import uasyncio.core as asyncio
+from uasyncio.tasks import create_task, gather, as_completed, bounded_map
+
+
+loop = asyncio.get_event_loop()
+
+
+def work(ms, res):
+    yield from asyncio.sleep_ms(ms)
+    if isinstance(res, Exception):
+        raise res
+    return res
+
+
+def main():
+    t = create_task(work(10, 1))
+    assert not t.done
+    assert (yield from t) == 1
+    assert t.done and t.result() == 1
+    # Waiting for a finished task returns immediately
+    assert (yield from t) == 1
+
+    t = create_task(work(5, ValueError("x")))
+    try:
+        yield from t
+        assert False
+    except ValueError:
+        pass
+
+    # Cancelled task finishes with CancelledError
+    t = create_task(work(100, 1))
+    yield from asyncio.sleep_ms(1)
+    t.cancel()
+    try:
+        yield from t
+        assert False
+    except asyncio.CancelledError:
+        pass
+
+    res = yield from gather(work(20, "a"), work(10, "b"), create_task(work(1, "c")))
+    assert res == ["a", "b", "c"], res
+    res = yield from gather(work(1, 1), work(1, KeyError()), return_exceptions=True)
+    assert res[0] == 1 and isinstance(res[1], KeyError), res
+
+    res = []
+    for c in as_completed([work(30, 3), work(10, 1), work(20, 2)]):
+        res.append((yield from c))
+    assert res == [1, 2, 3], res
+
+    # At most limit coroutines in flight, results in completion order
+    inflight = [0, 0]
+    def poll(i):
+        inflight[0] += 1
+        inflight[1] = max(inflight)
+        yield from asyncio.sleep_ms((10 - i) * 3)
+        inflight[0] -= 1
+        return i
+    res = []
+    for c in bounded_map(poll, range(10), 3):
+        res.append((yield from c))
+    assert sorted(res) == list(range(10)), res
+    assert res[:3] == [2, 1, 0], res
+    assert inflight[1] == 3, inflight
+    assert list(bounded_map(poll, [], 3)) == []
+
+
+loop.run_until_complete(main())
+print("OK")
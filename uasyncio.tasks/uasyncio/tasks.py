@@ -0,0 +1,203 @@
+from uasyncio import core
+
+
+class Task:
+    # Handle of a coroutine scheduled by create_task(). Can be waited
+    # for with "yield from task" (or "await task"), which returns the
+    # coroutine's result or raises its exception. Unlike with
+    # loop.create_task(), exceptions of the coroutine don't propagate
+    # into the event loop, so should be retrieved by waiting.
+
+    def __init__(self):
+        self.done = False
+        self.res = None
+        self.exc = None
+        # Tasks waiting for us, and done callbacks
+        self.waiters = []
+        self.callbacks = None
+        # Top-level coroutine running in the loop
+        self.coro = None
+
+    def result(self):
+        assert self.done
+        if self.exc:
+            raise self.exc
+        return self.res
+
+    def cancel(self):
+        if not self.done:
+            core.cancel(self.coro)
+
+    def add_done_callback(self, cb):
+        if self.done:
+            core.get_event_loop().call_soon(cb, self)
+        elif self.callbacks is None:
+            self.callbacks = [cb]
+        else:
+            self.callbacks.append(cb)
+
+    def _finish(self):
+        self.done = True
+        for task in self.waiters:
+            core.resume(task)
+        self.waiters = None
+        if self.callbacks:
+            for cb in self.callbacks:
+                cb(self)
+            self.callbacks = None
+
+    def __iter__(self):
+        if not self.done:
+            task = core.get_event_loop().cur_task
+            self.waiters.append(task)
+            try:
+                yield from core.suspend()
+            except:
+                if not self.done:
+                    self.waiters.remove(task)
+                raise
+        return self.result()
+
+    __await__ = __iter__
+
+    def __repr__(self):
+        return "<Task %r done=%s>" % (self.coro, self.done)
+
+
+def _run(t, coro):
+    try:
+        t.res = yield from coro
+    except Exception as e:
+        # Including CancelledError
+        t.exc = e
+    t._finish()
+
+
+def create_task(coro):
+    t = Task()
+    t.coro = _run(t, coro)
+    core.get_event_loop().call_soon(t.coro)
+    return t
+
+
+def _task(aw):
+    if isinstance(aw, Task):
+        return aw
+    return create_task(aw)
+
+
+def gather(*aws, return_exceptions=False):
+    # Run coroutines (or wait for tasks) concurrently, and return list of
+    # their results, in order. If return_exceptions is False, the first
+    # exception (in order) is raised, otherwise exceptions are returned
+    # in place of results.
+    tasks = [_task(aw) for aw in aws]
+    res = []
+    for t in tasks:
+        try:
+            res.append((yield from t))
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            res.append(e)
+    return res
+
+
+class _Completed:
+    # Tasks in order of completion
+
+    def __init__(self, on_done=None):
+        self.done = []
+        self.pos = 0
+        self.waiter = None
+        # Number of tasks added and not yet completed
+        self.running = 0
+        self.on_done = on_done
+
+    def add(self, t):
+        self.running += 1
+        t.add_done_callback(self._done)
+
+    def _done(self, t):
+        self.running -= 1
+        self.done.append(t)
+        task = self.waiter
+        if task:
+            self.waiter = None
+            core.resume(task)
+        if self.on_done:
+            self.on_done()
+
+    def next(self):
+        # Wait for the next completed task, and return its result
+        if self.pos == len(self.done):
+            assert self.waiter is None, "wait for previous result first"
+            task = core.get_event_loop().cur_task
+            self.waiter = task
+            try:
+                yield from core.suspend()
+            except:
+                self.waiter = None
+                raise
+        t = self.done[self.pos]
+        self.done[self.pos] = None
+        self.pos += 1
+        if self.pos == len(self.done):
+            self.done = []
+            self.pos = 0
+        return t.result()
+
+    def __len__(self):
+        return len(self.done) - self.pos + self.running
+
+
+def as_completed(aws):
+    # Return iterator of coroutines, each returning the next result (or
+    # raising the next exception) in order of completion:
+    #
+    # for c in as_completed(coros):
+    #     res = yield from c
+    c = _Completed()
+    for aw in aws:
+        c.add(_task(aw))
+    return (c.next() for i in range(len(c)))
+
+
+class _BoundedMap:
+
+    def __init__(self, coro_fn, iterable, limit):
+        assert limit > 0
+        self.fn = coro_fn
+        self.it = iter(iterable)
+        self.limit = limit
+        self.c = _Completed(self._fill)
+        self._fill()
+
+    def _fill(self):
+        c = self.c
+        while self.it is not None and c.running < self.limit:
+            try:
+                item = next(self.it)
+            except StopIteration:
+                self.it = None
+                break
+            c.add(create_task(self.fn(item)))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not len(self.c):
+            raise StopIteration
+        return self.c.next()
+
+
+def bounded_map(coro_fn, iterable, limit):
+    # Run coro_fn(item) for each item of iterable, keeping at most limit
+    # coroutines in flight (items are consumed lazily). Returns iterator
+    # of coroutines returning results in order of completion, like
+    # as_completed():
+    #
+    # for c in bounded_map(poll_sensor, sensors, 10):
+    #     res = yield from c
+    return _BoundedMap(coro_fn, iterable, limit)
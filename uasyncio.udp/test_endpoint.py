@@ -0,0 +1,44 @@
+import usocket
+import uasyncio
+from uasyncio import udp
+
+
+addr = usocket.getaddrinfo("127.0.0.1", 8082)[0][-1]
+
+rsock = udp.socket()
+rsock.bind(addr)
+ssock = udp.socket()
+ssock.connect(addr)
+
+got = []
+
+def on_datagram(data, a):
+    # data is only valid until the ring wraps, copy it
+    got.append(bytes(data))
+
+ep = udp.DatagramEndpoint(rsock, on_datagram, nbufs=4, bufsize=64)
+out = udp.DatagramEndpoint(ssock, None, max_queue=8)
+N = 50
+
+
+def sender():
+    for i in range(N):
+        assert out.send(b"dgram%d" % i)
+    await out.drain()
+    assert not out.outq
+    await uasyncio.sleep_ms(50)
+    await ep.close()
+    await out.close()
+
+
+loop = uasyncio.get_event_loop()
+loop.create_task(ep.run())
+loop.run_until_complete(sender())
+
+assert got == [b"dgram%d" % i for i in range(N)], got
+assert ep.rx == N
+# Several datagrams were received per wakeup
+assert ep.rx_wakeups < N, ep.rx_wakeups
+assert out.tx == N
+print(ep.rx_wakeups, "wakeups for", N, "datagrams")
+print("OK")
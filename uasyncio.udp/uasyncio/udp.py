@@ -1,3 +1,4 @@
+import uerrno
 import usocket
 from uasyncio import core
 
@@ -45,13 +46,183 @@ def recvfrom(s, n):
 
 def sendto(s, buf, addr=None):
     while 1:
-        res = s.sendto(buf, addr)
-        #print("send res:", res)
-        if res == len(buf):
-            return
-        print("sendto: IOWrite")
+        try:
+            res = s.sendto(buf, addr)
+            #print("send res:", res)
+            if res == len(buf):
+                return
+        except OSError as e:
+            if e.args[0] != uerrno.EAGAIN:
+                raise
+        if DEBUG and __debug__:
+            log.debug("sendto: IOWrite")
         yield core.IOWrite(s)
 
 def close(s):
     yield core.IOReadDone(s)
     s.close()
+
+
+def _flush_cb(ep):
+    ep._flush()
+
+
+class DatagramEndpoint:
+    # High-rate datagram endpoint. A receive task (ep.run()) reads all
+    # pending datagrams on each wakeup (up to batch), and passes each to
+    # callback cb(data, addr). Unless with_addr is set (then addr is None,
+    # which is enough for a connected socket or when the sender doesn't
+    # matter), datagrams are read without allocation into a ring of nbufs
+    # preallocated buffers, and data is a memoryview, valid until nbufs-1
+    # more datagrams are received (copy it to keep longer). With
+    # with_addr, data is a new bytes object.
+    #
+    # Outgoing datagrams are sent with non-coroutine send(), which queues
+    # them (up to max_queue) if the socket isn't writable.
+
+    def __init__(self, sock, cb, nbufs=8, bufsize=1536, batch=64, with_addr=False, max_queue=32):
+        self.s = sock
+        self.cb = cb
+        self.with_addr = with_addr
+        self.bufsize = bufsize
+        self.bufs = None
+        if not with_addr:
+            self.bufs = [memoryview(bytearray(bufsize)) for i in range(nbufs)]
+        self.bi = 0
+        self.batch = batch
+        self.max_queue = max_queue
+        # Outbound queue of (data, addr)
+        self.outq = []
+        self.flush_pending = False
+        self.waiters = []
+        self.closed = False
+        self.running = False
+        # Counters
+        self.rx = 0
+        self.rx_wakeups = 0
+        self.tx = 0
+        self.tx_queued = 0
+        self.tx_dropped = 0
+
+    def run(self):
+        s = self.s
+        self.running = True
+        try:
+            while not self.closed:
+                yield core.IORead(s)
+                self.rx_wakeups += 1
+                self._recv_batch()
+        except GeneratorExit:
+            raise
+        except:
+            self.running = False
+            yield core.IOReadDone(s)
+            raise
+
+    def _recv_batch(self):
+        s = self.s
+        cb = self.cb
+        bufs = self.bufs
+        for i in range(self.batch):
+            if bufs is None:
+                try:
+                    data, addr = s.recvfrom(self.bufsize)
+                except OSError as e:
+                    if e.args[0] == uerrno.EAGAIN:
+                        return
+                    raise
+            else:
+                buf = bufs[self.bi]
+                n = s.readinto(buf)
+                if n is None:
+                    return
+                self.bi += 1
+                if self.bi == len(bufs):
+                    self.bi = 0
+                data = buf[:n]
+                addr = None
+            self.rx += 1
+            cb(data, addr)
+            if self.closed:
+                return
+
+    def _sendto(self, buf, addr):
+        # Returns False if socket isn't writable
+        try:
+            if addr is None:
+                self.s.send(buf)
+            else:
+                self.s.sendto(buf, addr)
+        except OSError as e:
+            if e.args[0] == uerrno.EAGAIN:
+                return False
+            raise
+        self.tx += 1
+        return True
+
+    def send(self, buf, addr=None):
+        # Send datagram, or queue it (copied) if the socket isn't writable.
+        # Returns False if it's dropped because the queue is full (use
+        # drain() to wait for the queue to be flushed).
+        if not self.outq and self._sendto(buf, addr):
+            return True
+        if len(self.outq) >= self.max_queue:
+            self.tx_dropped += 1
+            return False
+        self.outq.append((bytes(buf), addr))
+        self.tx_queued += 1
+        self._schedule_flush()
+        return True
+
+    def _schedule_flush(self):
+        if self.flush_pending:
+            return
+        self.flush_pending = True
+        loop = core.get_event_loop()
+        if getattr(loop, "persistent", False):
+            loop.add_writer(self.s, _flush_cb, self)
+        else:
+            # In one-shot poll mode, a socket can't be waited for both
+            # reading (by run()) and writing. Send buffer of a datagram
+            # socket frees up quickly, so just retry a bit later.
+            loop.call_later_ms(1, _flush_cb, self)
+
+    def _flush(self):
+        self.flush_pending = False
+        q = self.outq
+        while q:
+            e = q[0]
+            try:
+                if not self._sendto(e[0], e[1]):
+                    self._schedule_flush()
+                    return
+            except OSError as ex:
+                # Don't let it propagate into the loop, datagram is lost
+                # as if it was lost on the way.
+                if DEBUG and __debug__:
+                    log.warning("DatagramEndpoint: send error: %s", ex)
+                self.tx_dropped += 1
+            q.pop(0)
+        waiters = self.waiters
+        self.waiters = []
+        for task in waiters:
+            core.resume(task)
+
+    def drain(self):
+        # Wait until outbound queue is flushed
+        while self.outq:
+            task = core.get_event_loop().cur_task
+            self.waiters.append(task)
+            try:
+                yield from core.suspend()
+            except:
+                if task in self.waiters:
+                    self.waiters.remove(task)
+                raise
+
+    def close(self):
+        self.closed = True
+        if self.running:
+            self.running = False
+            yield core.IOReadDone(self.s)
+        self.s.close()
@@ -7,7 +7,7 @@ sys.path.append("..")
 import sdist_upip
 
 setup(name='micropython-uasyncio.websocket.server',
-      version='0.1',
+      version='0.2',
       description='uasyncio.websocket.server module for MicroPython',
       long_description="This is a module reimplemented specifically for MicroPython standard library,\nwith efficient and lean design in mind. Note that this module is likely work\nin progress and likely supports just a subset of CPython's corresponding\nmodule. Please help with the development if you are interested in this\nmodule.",
       url='https://github.com/micropython/micropython-lib',
@@ -18,4 +18,4 @@ setup(name='micropython-uasyncio.websocket.server',
       license='MIT',
       cmdclass={'sdist': sdist_upip.sdist},
       packages=['uasyncio.websocket'],
-      install_requires=['micropython-uasyncio'])
+      install_requires=['micropython-uasyncio>=2.1', 'micropython-uasyncio.core>=2.1', 'micropython-uasyncio.http.server'])
@@ -0,0 +1,82 @@
+import uasyncio
+from uasyncio.websocket.server import WSBroadcast
+
+
+class MockStream:
+    # Stands for StreamWriter of a connection which takes delay ms to
+    # accept each frame.
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.frames = []
+
+    def awrite(self, buf):
+        self.frames.append(buf)
+        yield from uasyncio.sleep_ms(self.delay)
+
+
+class MockWS:
+
+    def __init__(self, delay):
+        self.s = MockStream(delay)
+        self.deflate = False
+
+
+def test():
+    loop = uasyncio.get_event_loop(runq_grow=True)
+    loop.set_persistent(True)
+    group = WSBroadcast(max_queue=2)
+    fast = MockWS(0)
+    slow = MockWS(100)
+    group.add(fast)
+    group.add(slow)
+    assert len(group) == 2
+
+    def publisher():
+        for i in range(10):
+            group.publish("msg%d" % i)
+            yield from uasyncio.sleep_ms(10)
+        yield from uasyncio.sleep_ms(300)
+        group.remove(slow)
+        yield from uasyncio.sleep_ms(0)
+
+    uasyncio.get_event_loop().run_until_complete(publisher())
+
+    # Frame is encoded once and shared
+    assert fast.s.frames[0] is slow.s.frames[0]
+    assert fast.s.frames[0] == b"\x81\x04msg0"
+    assert len(fast.s.frames) == 10
+    # Slow consumer got the first and the last messages, older pending
+    # ones were dropped
+    assert slow.s.frames[0][2:] == b"msg0"
+    assert slow.s.frames[-1][2:] == b"msg9", slow.s.frames
+    assert len(slow.s.frames) < 10
+    assert group.dropped == 10 - len(slow.s.frames)
+    assert group.published == 10
+    assert group.sent == 10 + len(slow.s.frames)
+    assert len(group) == 1
+
+
+def test_many():
+    # More subscribers than default runq_len, all woken by each message
+    group = WSBroadcast()
+    subs = [MockWS(0) for i in range(40)]
+    for ws in subs:
+        group.add(ws)
+
+    def publisher():
+        for i in range(3):
+            group.publish("m%d" % i)
+        yield from uasyncio.sleep_ms(50)
+
+    loop = uasyncio.get_event_loop()
+    loop.run_until_complete(publisher())
+    for ws in subs:
+        assert [f[2:] for f in ws.s.frames] == [b"m0", b"m1", b"m2"], ws.s.frames
+    assert group.sent == 120 and not group.dropped
+    assert loop.runq_len > 16
+
+
+test()
+test_many()
+print("OK")
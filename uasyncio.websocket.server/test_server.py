@@ -0,0 +1,186 @@
+import uzlib
+import uasyncio
+from uasyncio.websocket.server import WSReader, WSWriter, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PONG, _unmask
+from uasyncio.http.server import HTTPError
+
+
+PORT = 8083
+MASK = b"\x12\x34\x56\x78"
+# Raw deflate of b"hello " * 20, with sync flush marker stripped
+DEFLATED = b"\xcaH\xcd\xc9\xc9W\xc8\xa0;\t\x00"
+
+
+def echo(reader, writer):
+    yield from reader.readline()
+    reader = yield from WSReader(reader, writer)
+    writer = WSWriter(reader, writer, frame_size=200)
+    while 1:
+        op, data = yield from reader.recv()
+        if op == OP_CLOSE:
+            break
+        yield from writer.send(data, op == OP_BINARY)
+    # Close of the peer was echoed, and connection is closed both ways
+    assert reader.closed and writer.closed
+    assert (yield from reader.recv()) == (OP_CLOSE, b"")
+    try:
+        yield from writer.send(b"late")
+        assert False, "sent after close"
+    except OSError:
+        pass
+    yield from writer.s.aclose()
+
+
+def frame(op, data, fin=True, rsv1=False):
+    n = len(data)
+    b0 = op | (0x80 if fin else 0) | (0x40 if rsv1 else 0)
+    if n < 126:
+        hdr = bytes([b0, 0x80 | n])
+    elif n < 0x10000:
+        hdr = bytes([b0, 0x80 | 126, n >> 8, n & 0xff])
+    else:
+        hdr = bytes([b0, 0x80 | 127]) + n.to_bytes(8, "big")
+    data = bytearray(data)
+    _unmask(data, MASK)
+    return hdr + MASK + data
+
+
+def inflate(data):
+    return uzlib.decompress(data + b"\x00\x00\xff\xff\x03\x00", -15)
+
+
+def read_frame(r):
+    hdr = yield from r.readexactly(2)
+    n = hdr[1] & 0x7f
+    if n == 126:
+        l = yield from r.readexactly(2)
+        n = l[0] << 8 | l[1]
+    data = yield from r.readexactly(n)
+    return hdr[0], data
+
+
+def handshake(port):
+    r, w = yield from uasyncio.open_connection("127.0.0.1", port)
+    yield from w.awrite(b"GET / HTTP/1.1\r\nSec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n"
+        b"Sec-WebSocket-Extensions: permessage-deflate; client_max_window_bits\r\n\r\n")
+    resp = []
+    while 1:
+        l = yield from r.readline()
+        if l == b"\r\n":
+            break
+        resp.append(l)
+    assert resp[0].startswith(b"HTTP/1.1 101"), resp
+    assert b"Sec-WebSocket-Accept: s3pPLMBiTxaQ9kYGzzhZRbK+xOo=\r\n" in resp, resp
+    return r, w, resp
+
+
+def client():
+    r, w, resp = yield from handshake(PORT)
+    assert b"permessage-deflate" in b"".join(resp), resp
+
+    # Short text message
+    yield from w.awrite(frame(OP_TEXT, b"hi"))
+    assert (yield from read_frame(r)) == (0x81, b"hi")
+
+    # Ping is answered, fragmented binary message with 16-bit length is
+    # reassembled, and sent back fragmented by frame_size (and compressed
+    # if the port can compress)
+    msg = bytes(range(256)) * 2 + b"tail"
+    yield from w.awrite(frame(OP_BINARY, msg[:300], False) + frame(9, b"p")
+        + frame(0, msg[300:]))
+    assert (yield from read_frame(r)) == (0x80 | OP_PONG, b"p")
+    res = b""
+    comp = None
+    while 1:
+        b0, data = yield from read_frame(r)
+        if comp is None:
+            comp = b0 & 0x40
+        res += data
+        if b0 & 0x80:
+            break
+    if comp:
+        res = inflate(res)
+    assert res == msg
+
+    # Compressed message
+    yield from w.awrite(frame(OP_TEXT, DEFLATED, rsv1=True))
+    b0, data = yield from read_frame(r)
+    if b0 & 0x40:
+        data = inflate(data)
+    assert data == b"hello " * 20
+
+    # Close is echoed
+    yield from w.awrite(frame(OP_CLOSE, b"\x03\xe8"))
+    assert (yield from read_frame(r)) == (0x88, b"\x03\xe8")
+    assert (yield from r.read()) == b""
+    yield from w.aclose()
+
+
+def closer(reader, writer, res):
+    yield from reader.readline()
+    reader = yield from WSReader(reader, writer)
+    writer = WSWriter(reader, writer)
+    # Stream-like access to message data, which may span messages
+    res.append((yield from reader.readline()))
+    res.append((yield from reader.readexactly(3)))
+    # Ping arriving after our close frame isn't answered
+    yield from writer.close()
+    res.append((yield from reader.recv()))
+    yield from writer.s.aclose()
+
+
+def client2(res):
+    r, w, resp = yield from handshake(PORT + 10)
+    yield from w.awrite(frame(OP_TEXT, b"ab") + frame(OP_TEXT, b"c\nxyz"))
+    assert (yield from read_frame(r)) == (0x88, b"\x03\xe8")
+    yield from w.awrite(frame(9, b"p") + frame(OP_CLOSE, b"\x03\xe8"))
+    assert (yield from r.read()) == b""
+    yield from w.aclose()
+    assert res == [b"abc\n", b"xyz", (OP_CLOSE, b"")], res
+
+
+def bad_headers(reader, writer, res):
+    yield from reader.readline()
+    try:
+        yield from WSReader(reader, writer)
+    except HTTPError as e:
+        res.append(e.args[0])
+    yield from writer.aclose()
+
+
+def client3(res):
+    # Handshake headers have the same limits as HTTP requests
+    many = b"".join(b"X-%d: 1\r\n" % i for i in range(40))
+    for hdrs in (many, b"Bad header\r\n", b"X: " + b"x" * 3000 + b"\r\n"):
+        r, w = yield from uasyncio.open_connection("127.0.0.1", PORT + 11)
+        yield from w.awrite(b"GET / HTTP/1.1\r\nSec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n"
+            + hdrs + b"\r\n")
+        try:
+            yield from r.read()
+        except OSError:
+            # Reset, as the server closes without reading all data
+            pass
+        yield from w.aclose()
+    assert res == [431, 400, 431], res
+
+
+def test():
+    for d in (b"", b"abc", bytes(range(256)) * 3 + b"xy"):
+        b = bytearray(d)
+        _unmask(b, MASK)
+        assert b == bytes(x ^ MASK[i % 4] for i, x in enumerate(d))
+        _unmask(b, MASK)
+        assert b == d
+
+    loop = uasyncio.get_event_loop()
+    loop.create_task(uasyncio.start_server(echo, "127.0.0.1", PORT))
+    loop.run_until_complete(client())
+    res = []
+    loop.create_task(uasyncio.start_server(lambda r, w: closer(r, w, res), "127.0.0.1", PORT + 10))
+    loop.run_until_complete(client2(res))
+    res = []
+    loop.create_task(uasyncio.start_server(lambda r, w: bad_headers(r, w, res), "127.0.0.1", PORT + 11))
+    loop.run_until_complete(client3(res))
+    print("OK")
+
+
+test()
@@ -1,6 +1,36 @@
+import uerrno
 import uasyncio
 import uhashlib, ubinascii
-import websocket
+from uasyncio.http.server import HTTPError, parse_headers
+try:
+    import uzlib
+except ImportError:
+    uzlib = None
+
+
+OP_CONT = 0
+OP_TEXT = 1
+OP_BINARY = 2
+OP_CLOSE = 8
+OP_PING = 9
+OP_PONG = 10
+
+CLOSE_OK = 1000
+CLOSE_PROTOCOL_ERROR = 1002
+CLOSE_BAD_DATA = 1007
+CLOSE_TOO_BIG = 1009
+
+# Appended to a received compressed message: the sync flush marker
+# stripped by the sender (RFC 7692), followed by an empty final block,
+# so the message is a complete raw deflate stream.
+_DEFLATE_TAIL = b"\x00\x00\xff\xff\x03\x00"
+
+_DEFLATE_RESP = b"Sec-WebSocket-Extensions: permessage-deflate; server_no_context_takeover; client_no_context_takeover\r\n"
+
+
+class ProtocolError(ValueError):
+    # args: (close code, description)
+    pass
 
 
 def make_respkey(webkey):
@@ -12,52 +42,497 @@ def make_respkey(webkey):
     return respkey
 
 
+def _unmask(buf, mask):
+    # XOR buf with 4-byte mask in place. Chunks of payload are converted
+    # to big integers, so XOR is performed a machine word at a time in C,
+    # instead of a byte at a time in Python.
+    n = len(buf)
+    chunk = 256
+    i = 0
+    if n >= chunk:
+        m = int.from_bytes(mask * (chunk // 4), "little")
+        while i + chunk <= n:
+            v = int.from_bytes(buf[i:i + chunk], "little") ^ m
+            buf[i:i + chunk] = v.to_bytes(chunk, "little")
+            i += chunk
+    if i < n:
+        k = n - i
+        m = int.from_bytes((mask * (k // 4 + 1))[:k], "little")
+        v = int.from_bytes(buf[i:], "little") ^ m
+        buf[i:] = v.to_bytes(k, "little")
+
+
+def _can_compress():
+    # uzlib of MicroPython can only decompress, but if the port provides
+    # (CPython-compatible) compressobj(), outgoing messages are compressed
+    # too.
+    return hasattr(uzlib, "compressobj")
+
+
+def _compress(data):
+    c = uzlib.compressobj(-1, 8, -15)
+    # Z_SYNC_FLUSH
+    data = c.compress(data) + c.flush(2)
+    return memoryview(data)[:-4]
+
+
+def _make_header(h, opcode, n, fin, rsv1):
+    # Put header of (unmasked) frame with payload length n into h, return
+    # its length
+    h[0] = opcode | (0x80 if fin else 0) | (0x40 if rsv1 else 0)
+    if n < 126:
+        h[1] = n
+        return 2
+    if n < 0x10000:
+        h[1] = 126
+        h[2] = n >> 8
+        h[3] = n & 0xff
+        return 4
+    h[1] = 127
+    h[2:10] = n.to_bytes(8, "big")
+    return 10
+
+
+def encode_frame(opcode, data, rsv1=False):
+    # Return complete frame as a single buffer
+    n = len(data)
+    hdr = bytearray(10)
+    l = _make_header(hdr, opcode, n, True, rsv1)
+    buf = bytearray(l + n)
+    buf[:l] = memoryview(hdr)[:l]
+    buf[l:] = data
+    return buf
+
+
 class WSWriter:
+    # Frames are written with buffered StreamWriter.write(), so header and
+    # payload go out in one syscall, and a frame is never interleaved with
+    # another one, even if several WSWriter's write to the same connection
+    # (e.g. one sending pongs).
 
-    def __init__(self, reader, writer):
-        # Reader is passed for symmetry with WSReader() and ignored.
+    def __init__(self, reader, writer, frame_size=0, compress_min=64):
         self.s = writer
+        # Messages longer than frame_size are sent fragmented
+        self.frame_size = frame_size
+        # Compress messages at least compress_min long, if permessage-deflate
+        # was negotiated by WSReader()
+        self.compress_min = compress_min
+        self.deflate = getattr(reader, "deflate", False) and _can_compress()
+        self.hdr = bytearray(10)
+        # If reader is WSFrameReader, close state is kept by it, so it's
+        # shared with the WSWriter it replies to pings and close with.
+        if not isinstance(reader, WSFrameReader):
+            reader = None
+        self.r = reader
+        self._closed = False
+
+    @property
+    def closed(self):
+        # Close frame was sent, no more frames may be
+        if self.r:
+            return self.r.close_sent
+        return self._closed
+
+    def send_frame(self, opcode, data, fin=True, rsv1=False):
+        if self.closed:
+            raise OSError(uerrno.ENOTCONN)
+        yield from self._write_frame(opcode, data, fin, rsv1)
+
+    def _write_frame(self, opcode, data, fin=True, rsv1=False):
+        n = len(data)
+        l = _make_header(self.hdr, opcode, n, fin, rsv1)
+        self.s.write(memoryview(self.hdr)[:l])
+        if n:
+            self.s.write(data)
+        yield from self.s.drain()
+
+    def send(self, data, binary=False):
+        if isinstance(data, str):
+            data = data.encode()
+        op = OP_BINARY if binary else OP_TEXT
+        rsv1 = False
+        if self.deflate and len(data) >= self.compress_min:
+            data = _compress(data)
+            rsv1 = True
+        fs = self.frame_size
+        n = len(data)
+        if not fs or n <= fs:
+            yield from self.send_frame(op, data, True, rsv1)
+            return
+        mv = memoryview(data)
+        i = 0
+        while i < n:
+            yield from self.send_frame(op, mv[i:i + fs], i + fs >= n, rsv1)
+            op = OP_CONT
+            rsv1 = False
+            i += fs
+
+    def awrite(self, data):
+        yield from self.send(data)
+
+    def send_stream(self, src, binary=True, chunk=1024):
+        # Send data read from src until EOF as a fragmented message, without
+        # having it in memory as a whole. src is a StreamReader, or a
+        # file-like object with readinto().
+        buf = bytearray(chunk)
+        mv = memoryview(buf)
+        op = OP_BINARY if binary else OP_TEXT
+        is_stream = isinstance(src, uasyncio.StreamReader)
+        while 1:
+            if is_stream:
+                n = yield from src.readexactly_into(mv)
+            else:
+                n = src.readinto(buf)
+            if not n:
+                break
+            yield from self.send_frame(op, mv[:n], False)
+            op = OP_CONT
+        yield from self.send_frame(op, b"", True)
+
+    def ping(self, data=b""):
+        yield from self.send_frame(OP_PING, data)
+
+    def pong(self, data=b""):
+        yield from self.send_frame(OP_PONG, data)
+
+    def close(self, code=CLOSE_OK, reason=b""):
+        if self.closed:
+            return
+        if self.r:
+            self.r.close_sent = True
+        else:
+            self._closed = True
+        yield from self._write_frame(OP_CLOSE, code.to_bytes(2, "big") + reason)
 
-    async def awrite(self, data):
-        assert len(data) < 126
-        await self.s.awrite(b"\x81")
-        await self.s.awrite(bytes([len(data)]))
-        await self.s.awrite(data)
 
+class _Subscriber:
 
-def WSReader(reader, writer):
+    def __init__(self, ws, max_queue):
+        self.ws = ws
+        self.max_queue = max_queue
+        # Frames pending to be sent
+        self.q = []
+        # Sender task, while it waits for frames
+        self.task = None
+        self.dropped = 0
+        self.closed = False
 
-        webkey = None
+
+class WSBroadcast:
+    # Sends the same messages to a group of connections. A message is
+    # framed (and compressed) once, and the frame buffer is shared by
+    # queues of all connections. Each connection has a sender task writing
+    # frames from its queue, so a slow client only delays itself. Once its
+    # queue holds max_queue frames, the oldest one is dropped for each new
+    # one, i.e. a slow client receives the latest messages with gaps (with
+    # max_queue=1, only the latest one), and memory use stays bounded.
+    #
+    # Senders write to connections whose reader tasks wait on the same
+    # sockets, so the loop must be in persistent poll mode (see
+    # PollEventLoop.set_persistent()). A message wakes up all senders at
+    # once, as the poller may wake up all connections, so runq should be
+    # created with runq_grow=True (or runq_len big enough). add() checks
+    # both.
+
+    def __init__(self, max_queue=4, compress_min=64):
+        self.max_queue = max_queue
+        self.compress_min = compress_min
+        self.subs = []
+        # Counters
+        self.published = 0
+        self.sent = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.subs)
+
+    def add(self, ws, max_queue=None):
+        # Subscribe connection with WSWriter ws
+        loop = uasyncio.get_event_loop()
+        if not loop.persistent:
+            raise ValueError("WSBroadcast needs persistent poll mode")
+        # Sender and reader task of each connection may be in runq at once
+        if not loop.runq_grow and 2 * (len(self.subs) + 1) > loop.runq_len:
+            raise ValueError("WSBroadcast needs runq_grow or bigger runq_len")
+        sub = _Subscriber(ws, max_queue or self.max_queue)
+        self.subs.append(sub)
+        loop.create_task(self._sender(sub))
+        return sub
+
+    def remove(self, ws):
+        for sub in self.subs:
+            if sub.ws is ws:
+                sub.closed = True
+                self.subs.remove(sub)
+                self._wake(sub)
+                return
+
+    def _wake(self, sub):
+        task = sub.task
+        if task is not None:
+            sub.task = None
+            uasyncio.resume(task)
+
+    def publish(self, data, binary=False):
+        # Not a coroutine: queues the message for all connections and
+        # returns immediately.
+        if isinstance(data, str):
+            data = data.encode()
+        op = OP_BINARY if binary else OP_TEXT
+        frame = cframe = None
+        compress = len(data) >= self.compress_min
+        self.published += 1
+        for sub in self.subs:
+            if compress and sub.ws.deflate:
+                if cframe is None:
+                    cframe = encode_frame(op, _compress(data), True)
+                f = cframe
+            else:
+                if frame is None:
+                    frame = encode_frame(op, data)
+                f = frame
+            q = sub.q
+            if len(q) >= sub.max_queue:
+                q.pop(0)
+                sub.dropped += 1
+                self.dropped += 1
+            q.append(f)
+            self._wake(sub)
+
+    def _sender(self, sub):
+        s = sub.ws.s
+        try:
+            while not sub.closed:
+                if not sub.q:
+                    sub.task = uasyncio.get_event_loop().cur_task
+                    yield from uasyncio.suspend()
+                    continue
+                yield from s.awrite(sub.q.pop(0))
+                self.sent += 1
+        except OSError:
+            # Connection is broken, its reader will notice
+            pass
+        finally:
+            sub.task = None
+            sub.q = []
+            if sub in self.subs:
+                self.subs.remove(sub)
+
+
+class WSFrameReader:
+    # Returned by WSReader(). recv() returns next message, handling control
+    # frames (replying to pings and close) and reassembling fragments.
+    # read(), readinto(), readexactly() and readline() provide access to
+    # message data as a stream, like StreamReader WSReader() used to
+    # return.
+
+    def __init__(self, reader, writer, deflate=False, max_size=65536):
+        self.r = reader
+        self.ios = reader.ios
+        self.deflate = deflate
+        self.max_size = max_size
+        self.hdr = bytearray(8)
+        self.mask = bytearray(4)
+        # Close frame was received (or connection failed)
+        self.closed = False
+        # Close frame was sent, by any WSWriter of the connection
+        self.close_sent = False
+        self.w = WSWriter(self, writer)
+        self.pending = b""
+        self.ppos = 0
+
+    def _readexactly(self, buf):
+        n = yield from self.r.readexactly_into(buf)
+        if n < len(buf):
+            raise EOFError
+        return n
+
+    def read_frame(self):
+        # Returns (opcode, fin, rsv1, payload), payload is unmasked
+        hdr = memoryview(self.hdr)
+        yield from self._readexactly(hdr[:2])
+        b0 = hdr[0]
+        b1 = hdr[1]
+        if b0 & 0x30:
+            raise ProtocolError(CLOSE_PROTOCOL_ERROR, "reserved bits set")
+        if not b1 & 0x80:
+            raise ProtocolError(CLOSE_PROTOCOL_ERROR, "unmasked frame")
+        n = b1 & 0x7f
+        if n == 126:
+            yield from self._readexactly(hdr[:2])
+            n = hdr[0] << 8 | hdr[1]
+        elif n == 127:
+            yield from self._readexactly(hdr)
+            n = int.from_bytes(hdr, "big")
+        if n > self.max_size:
+            raise ProtocolError(CLOSE_TOO_BIG, "frame too big")
+        yield from self._readexactly(self.mask)
+        data = bytearray(n)
+        if n:
+            yield from self._readexactly(data)
+            _unmask(data, self.mask)
+        return b0 & 0x0f, b0 & 0x80, b0 & 0x40, data
+
+    def _recv(self):
+        msg = None
+        op = 0
+        comp = False
         while 1:
-            l = yield from reader.readline()
-            print(l)
-            if not l:
-                raise ValueError()
-            if l == b"\r\n":
+            fop, fin, rsv1, data = yield from self.read_frame()
+            if fop >= OP_CLOSE:
+                if not fin or len(data) > 125:
+                    raise ProtocolError(CLOSE_PROTOCOL_ERROR, "bad control frame")
+                if fop == OP_PING:
+                    # No frames may follow our close frame
+                    if not self.close_sent:
+                        yield from self.w.pong(data)
+                elif fop == OP_CLOSE:
+                    code = CLOSE_OK
+                    if len(data) >= 2:
+                        code = data[0] << 8 | data[1]
+                    # Echo it (unless we initiated closing), RFC 6455
+                    # 5.5.1
+                    yield from self.w.close(code)
+                    self.closed = True
+                    return OP_CLOSE, b""
+                elif fop != OP_PONG:
+                    raise ProtocolError(CLOSE_PROTOCOL_ERROR, "bad opcode")
+                continue
+            if fop == OP_CONT:
+                if msg is None or rsv1:
+                    raise ProtocolError(CLOSE_PROTOCOL_ERROR, "unexpected continuation")
+                if len(msg) + len(data) > self.max_size:
+                    raise ProtocolError(CLOSE_TOO_BIG, "message too big")
+                msg.extend(data)
+            else:
+                if msg is not None or fop > OP_BINARY:
+                    raise ProtocolError(CLOSE_PROTOCOL_ERROR, "bad opcode")
+                if rsv1 and not self.deflate:
+                    raise ProtocolError(CLOSE_PROTOCOL_ERROR, "unexpected compression")
+                op = fop
+                comp = rsv1
+                msg = data
+            if fin:
                 break
-            if l.startswith(b'Sec-WebSocket-Key'):
-                webkey = l.split(b":", 1)[1]
-                webkey = webkey.strip()
+        if comp:
+            msg.extend(_DEFLATE_TAIL)
+            try:
+                msg = uzlib.decompress(msg, -15)
+            except Exception:
+                raise ProtocolError(CLOSE_BAD_DATA, "bad compressed data")
+        return op, msg
 
-        if not webkey:
-            raise ValueError("Not a websocker request")
+    def recv(self):
+        # Returns (opcode, data) of next message, opcode being OP_TEXT or
+        # OP_BINARY, or (OP_CLOSE, b"") once connection is closed. On
+        # protocol errors, connection is closed with corresponding code.
+        if self.closed:
+            return OP_CLOSE, b""
+        try:
+            return (yield from self._recv())
+        except EOFError:
+            pass
+        except ProtocolError as e:
+            yield from self.w.close(e.args[0])
+        self.closed = True
+        return OP_CLOSE, b""
 
-        respkey = make_respkey(webkey)
+    def _fill(self):
+        # Make sure there's unread message data, returns False on close
+        while self.ppos >= len(self.pending):
+            op, data = yield from self.recv()
+            if op == OP_CLOSE:
+                return False
+            self.pending = data
+            self.ppos = 0
+        return True
 
-        await writer.awrite(b"""\
+    def read(self, n=-1):
+        # Read up to n bytes of message data, b"" on close
+        if not (yield from self._fill()):
+            return b""
+        p = self.ppos
+        if n < 0:
+            n = len(self.pending) - p
+        self.ppos += n
+        return bytes(self.pending[p:p + n])
+
+    def readinto(self, buf):
+        # Returns number of bytes read, 0 on close
+        if not (yield from self._fill()):
+            return 0
+        p = self.ppos
+        n = min(len(buf), len(self.pending) - p)
+        buf[:n] = memoryview(self.pending)[p:p + n]
+        self.ppos += n
+        return n
+
+    def readexactly(self, n):
+        # Data may span messages, is shorter than n only on close
+        parts = []
+        while n:
+            data = yield from self.read(n)
+            if not data:
+                break
+            parts.append(data)
+            n -= len(data)
+        return b"".join(parts)
+
+    def readline(self):
+        # Data up to and including b"\n" (may span messages), or until
+        # close
+        parts = []
+        while (yield from self._fill()):
+            p = self.ppos
+            i = self.pending.find(b"\n", p)
+            end = len(self.pending) if i < 0 else i + 1
+            self.ppos = end
+            parts.append(bytes(self.pending[p:end]))
+            if i >= 0:
+                break
+        return b"".join(parts)
+
+    def aclose(self):
+        yield from self.r.aclose()
+
+
+def WSReader(reader, writer, deflate=True, max_size=65536, max_header=2048, max_headers=32):
+    # Perform handshake (request line should be already consumed) and
+    # return WSFrameReader. If deflate is true and uzlib is available,
+    # permessage-deflate is accepted when offered by the client. Headers
+    # are parsed by uasyncio.http.server.parse_headers(), with the same
+    # limits and HTTPError's as for HTTP requests.
+
+    block = b""
+    while 1:
+        try:
+            l = yield from reader.readuntil(b"\r\n", max_header - len(block))
+        except ValueError:
+            raise HTTPError(431)
+        if not l.endswith(b"\r\n"):
+            raise HTTPError(400)
+        if l == b"\r\n":
+            break
+        block += l
+    headers = parse_headers(block, max_headers)
+    webkey = headers.get("sec-websocket-key")
+    offer = "permessage-deflate" in headers.get("sec-websocket-extensions", "")
+
+    if not webkey:
+        raise ValueError("Not a websocker request")
+
+    deflate = deflate and offer and uzlib is not None
+
+    writer.write(b"""\
 HTTP/1.1 101 Switching Protocols\r
 Upgrade: websocket\r
 Connection: Upgrade\r
 Sec-WebSocket-Accept: """)
-        await writer.awrite(respkey)
-        # This will lead to "<key>\n\r\n" being written. Not exactly
-        # "\r\n\r\n", but browsers seem to eat it.
-        await writer.awrite("\r\n")
-        #await writer.awrite("\r\n\r\n")
-
-        print("Finished webrepl handshake")
-
-        ws = websocket.websocket(reader.ios)
-        rws = uasyncio.StreamReader(reader.ios, ws)
+    writer.write(make_respkey(webkey.encode())[:-1])
+    writer.write(b"\r\n")
+    if deflate:
+        writer.write(_DEFLATE_RESP)
+    writer.write(b"\r\n")
+    yield from writer.drain()
 
-        return rws
+    return WSFrameReader(reader, writer, deflate, max_size)
@@ -0,0 +1,38 @@
+# Benchmark client for test_echo_server.py: keeps CONNS connections
+# doing ping-pong round trips for DURATION seconds, prints round trips
+# per second.
+import sys
+import utime
+import uasyncio as asyncio
+
+
+CONNS = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+DURATION = 10
+MSG = b"x" * 64
+
+count = 0
+done = 0
+
+
+def client(deadline):
+    global count, done
+    reader, writer = yield from asyncio.open_connection("127.0.0.1", 8082)
+    while utime.ticks_diff(deadline, utime.ticks_ms()) > 0:
+        yield from writer.awrite(MSG)
+        yield from reader.readexactly(len(MSG))
+        count += 1
+    yield from writer.aclose()
+    done += 1
+
+
+def main():
+    deadline = utime.ticks_add(utime.ticks_ms(), DURATION * 1000)
+    for i in range(CONNS):
+        loop.create_task(client(deadline))
+    while done < CONNS:
+        yield from asyncio.sleep(1)
+    print("%d connections: %d round trips/s" % (CONNS, count // DURATION))
+
+
+loop = asyncio.get_event_loop(runq_grow=True)
+loop.run_until_complete(main())
@@ -0,0 +1,104 @@
+# Compare one-shot and persistent poll registrations of PollEventLoop
+# on real sockets: PAIRS connected loopback TCP socket pairs doing
+# ping-pong round trips for DURATION seconds, in a single process. For
+# each mode, prints round trips per second and number of poller
+# register/modify/unregister calls per round trip.
+import sys
+import utime
+import usocket
+import uasyncio as asyncio
+import uasyncio.core
+
+
+PAIRS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+DURATION = 5
+MSG = b"x" * 64
+
+
+class CountingPoll:
+    # uselect.poll proxy counting calls which change registrations
+
+    def __init__(self, poller):
+        self.poller = poller
+        self.calls = 0
+
+    def register(self, *args):
+        self.calls += 1
+        self.poller.register(*args)
+
+    def modify(self, *args):
+        self.calls += 1
+        self.poller.modify(*args)
+
+    def unregister(self, *args):
+        self.calls += 1
+        self.poller.unregister(*args)
+
+    def ipoll(self, *args):
+        return self.poller.ipoll(*args)
+
+
+def make_pairs(n):
+    srv = usocket.socket()
+    srv.setsockopt(usocket.SOL_SOCKET, usocket.SO_REUSEADDR, 1)
+    addr = usocket.getaddrinfo("127.0.0.1", 8085)[0][-1]
+    srv.bind(addr)
+    srv.listen(n)
+    pairs = []
+    for i in range(n):
+        c = usocket.socket()
+        c.connect(addr)
+        s = srv.accept()[0]
+        c.setblocking(False)
+        s.setblocking(False)
+        pairs.append((c, s))
+    srv.close()
+    return pairs
+
+
+def echo(s):
+    reader = asyncio.StreamReader(s)
+    writer = asyncio.StreamWriter(s, {})
+    while True:
+        data = yield from reader.read(512)
+        if not data:
+            break
+        yield from writer.awrite(data)
+    yield from writer.aclose()
+
+
+def ping(s, deadline, stat):
+    reader = asyncio.StreamReader(s)
+    writer = asyncio.StreamWriter(s, {})
+    while utime.ticks_diff(deadline, utime.ticks_ms()) > 0:
+        yield from writer.awrite(MSG)
+        yield from reader.readexactly(len(MSG))
+        stat[0] += 1
+    yield from writer.aclose()
+    stat[1] += 1
+
+
+def run(persistent):
+    uasyncio.core._event_loop = None
+    loop = asyncio.get_event_loop(runq_grow=True)
+    loop.set_persistent(persistent)
+    loop.poller = CountingPoll(loop.poller)
+    # [round trips, finished pingers]
+    stat = [0, 0]
+    deadline = utime.ticks_add(utime.ticks_ms(), DURATION * 1000)
+    for c, s in make_pairs(PAIRS):
+        loop.create_task(echo(s))
+        loop.create_task(ping(c, deadline, stat))
+
+    def main():
+        while stat[1] < PAIRS:
+            yield from asyncio.sleep_ms(100)
+
+    loop.run_until_complete(main())
+    print("%-10s %d pairs: %d round trips/s, %.2f poller calls/round trip" % (
+        "persistent" if persistent else "oneshot", PAIRS,
+        stat[0] // DURATION, loop.poller.calls / stat[0]))
+
+
+run(False)
+run(True)
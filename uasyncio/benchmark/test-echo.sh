@@ -0,0 +1,14 @@
+#!/bin/sh
+#
+# Compare echo server throughput with default (one-shot) and persistent
+# poll registrations.
+#
+
+for mode in oneshot persistent; do
+    micropython -O -X heapsize=16M test_echo_server.py $mode &
+    sleep 1
+    echo "Server mode: $mode"
+    micropython -O -X heapsize=16M echo_client.py 200
+    kill %1
+    wait
+done
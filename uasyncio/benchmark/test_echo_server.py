@@ -0,0 +1,21 @@
+# Echo server for benchmarking uasyncio I/O scheduling. Run with
+# "persistent" argument to use persistent poll registrations.
+import sys
+import uasyncio as asyncio
+
+
+def echo(reader, writer):
+    while True:
+        data = yield from reader.read(512)
+        if not data:
+            break
+        yield from writer.awrite(data)
+    yield from writer.aclose()
+
+
+loop = asyncio.get_event_loop(runq_grow=True)
+if "persistent" in sys.argv:
+    loop.set_persistent(True)
+loop.create_task(asyncio.start_server(echo, "127.0.0.1", 8082, backlog=100))
+loop.run_forever()
+loop.close()
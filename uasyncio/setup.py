@@ -7,7 +7,7 @@ sys.path.append("..")
 import sdist_upip
 
 setup(name='micropython-uasyncio',
-      version='2.0',
+      version='2.1',
       description='Lightweight asyncio-like library for MicroPython, built around native Python coroutines.',
       long_description=open('README.rst').read(),
       url='https://github.com/micropython/micropython-lib',
@@ -18,4 +18,4 @@ setup(name='micropython-uasyncio',
       license='MIT',
       cmdclass={'sdist': sdist_upip.sdist},
       packages=['uasyncio'],
-      install_requires=['micropython-uasyncio.core'])
+      install_requires=['micropython-uasyncio.core>=2.1'])
@@ -0,0 +1,64 @@
+import _thread
+import utime
+import uasyncio
+
+
+loop = uasyncio.get_event_loop()
+ticks = []
+
+
+def blocking(ms, v):
+    utime.sleep_ms(ms)
+    return v
+
+
+def failing():
+    raise ValueError("bad")
+
+
+def ticker():
+    # Keeps running while blocking calls are in progress
+    for i in range(5):
+        ticks.append(i)
+        yield from uasyncio.sleep_ms(20)
+
+
+def main():
+    loop.create_task(ticker())
+    t = utime.ticks_ms()
+    # Calls run in parallel in worker threads
+    res = []
+    for i in range(3):
+        loop.create_task(collect(res, i))
+    v = yield from loop.run_in_executor(blocking, 150, "x")
+    assert v == "x"
+    yield from uasyncio.sleep_ms(20)
+    assert sorted(res) == [0, 1, 2], res
+    assert utime.ticks_diff(utime.ticks_ms(), t) < 400
+    assert len(ticks) == 5, ticks
+    try:
+        yield from loop.run_in_executor(failing)
+        assert False
+    except ValueError as e:
+        assert e.args[0] == "bad"
+
+
+def collect(res, i):
+    res.append((yield from loop.run_in_executor(blocking, 150, i)))
+
+
+loop.run_until_complete(main())
+
+
+# call_soon_threadsafe() from a thread not started by run_in_executor()
+got = []
+
+def thread():
+    utime.sleep_ms(50)
+    loop.call_soon_threadsafe(got.append, 42)
+    loop.call_soon_threadsafe(loop.stop)
+
+_thread.start_new_thread(thread, ())
+loop.run_forever()
+assert got == [42], got
+print("OK")
@@ -0,0 +1,38 @@
+# Test prefork(): two worker processes serving the same port with
+# SO_REUSEPORT (unix port only)
+import os
+import uasyncio
+
+
+PORT = 8089
+
+
+def handler(worker):
+    def handle(reader, writer):
+        yield from writer.awrite(b"%d" % worker)
+        yield from writer.aclose()
+    return handle
+
+
+def client():
+    yield from uasyncio.sleep_ms(100)
+    seen = set()
+    # Kernel distributes connections by hash of addresses
+    for i in range(100):
+        reader, writer = yield from uasyncio.open_connection("127.0.0.1", PORT)
+        seen.add((yield from reader.read()))
+        yield from reader.aclose()
+        if len(seen) == 2:
+            break
+    assert seen == {b"0", b"1"}, seen
+
+
+worker = uasyncio.prefork(2)
+loop = uasyncio.get_event_loop()
+loop.create_task(uasyncio.start_server(handler(worker), "127.0.0.1", PORT, reuseport=True))
+if worker:
+    loop.run_until_complete(uasyncio.sleep(1))
+    os._exit(0)
+loop.run_until_complete(client())
+os.waitpid(-1, 0)
+print("OK")
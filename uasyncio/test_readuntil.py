@@ -0,0 +1,57 @@
+from uasyncio import StreamReader
+
+class MockSock:
+
+    def __init__(self, data_list):
+        self.data = data_list
+
+    def read(self, sz):
+        try:
+            res = self.data.pop(0)
+        except IndexError:
+            return b""
+        if len(res) > sz:
+            self.data.insert(0, res[sz:])
+            res = res[:sz]
+        return res
+
+    def readinto(self, buf):
+        res = self.read(len(buf))
+        assert len(res) <= len(buf)
+        buf[:len(res)] = res
+        return len(res)
+
+
+mock = MockSock([
+    b"GET / HTTP/1.1\r\nHost: a\r",
+    b"\n\r", b"\n",
+    b"body", b"12",
+    b"3456X", b"Y\r\n\r\nrest",
+])
+
+
+def func():
+    sr = StreamReader(mock)
+    assert await sr.readuntil(b"\r\n") == b"GET / HTTP/1.1\r\n"
+    # Separator spanning several chunks
+    assert await sr.readuntil(b"\r\n\r\n") == b"Host: a\r\n\r\n"
+    buf = bytearray(3)
+    assert await sr.readinto(buf) == 3
+    assert buf == b"bod"
+    # Consumes read-ahead data first, then reads directly into buffer
+    buf = bytearray(7)
+    assert await sr.readexactly_into(memoryview(buf)) == 7
+    assert buf == b"y123456"
+    try:
+        await sr.readuntil(b"\r\n", 3)
+        assert False
+    except ValueError:
+        pass
+
+    # Unterminated data at EOF is returned as is
+    sr = StreamReader(MockSock([b"ab", b"c"]))
+    assert await sr.readuntil(b"\r\n") == b"abc"
+    assert await sr.readuntil(b"\r\n") == b""
+
+for i in func():
+    pass
@@ -0,0 +1,47 @@
+import uos
+import uasyncio
+
+
+PORT = 8086
+FNAME = "test_sendfile.tmp"
+SIZE = 1000000
+
+with open(FNAME, "wb") as f:
+    for i in range(SIZE // 100):
+        f.write(b"%099d\n" % i)
+
+
+def serve(reader, writer):
+    with open(FNAME, "rb") as f:
+        # Data buffered by write() goes first
+        writer.write(b"head")
+        n = yield from writer.asendfile(f)
+        assert n == SIZE, n
+        n = yield from writer.asendfile(f, 150, 60)
+        assert n == 60, n
+    yield from writer.aclose()
+
+
+def client():
+    r, w = yield from uasyncio.open_connection("127.0.0.1", PORT)
+    data = yield from r.readexactly(4 + SIZE + 60)
+    assert data[:4] == b"head"
+    with open(FNAME, "rb") as f:
+        expected = f.read()
+    assert data[4:4 + SIZE] == expected
+    assert data[4 + SIZE:] == expected[150:210]
+    assert (yield from r.read()) == b""
+    yield from w.aclose()
+
+
+loop = uasyncio.get_event_loop()
+loop.create_task(uasyncio.start_server(serve, "127.0.0.1", PORT))
+loop.run_until_complete(client())
+print("sendfile:", bool(uasyncio._get_sendfile()))
+
+# Fallback copying through a buffer
+uasyncio._sendfile = False
+loop.run_until_complete(client())
+
+uos.remove(FNAME)
+print("OK")
@@ -0,0 +1,91 @@
+# Test start_server(): batched accept with fixed-size runq, connection
+# limit, and cancellation of a server paused at the limit. Expects the
+# default event loop (runq_len=16, not growing).
+import usocket
+import uasyncio
+
+
+PORT = 8087
+N = 40
+
+
+def connect(port):
+    # Blocking connect to a listening socket completes via the listen
+    # backlog, without the server accepting it yet
+    s = usocket.socket()
+    s.connect(usocket.getaddrinfo("127.0.0.1", port)[0][-1])
+    s.setblocking(False)
+    return s
+
+
+def hello(reader, writer):
+    yield from writer.awrite(b"hi")
+    yield from writer.aclose()
+
+
+def wait_line(reader, writer, conns):
+    conns.append(writer)
+    yield from reader.readline()
+    conns.remove(writer)
+    yield from writer.aclose()
+
+
+def test_batch():
+    # More pending connections than runq can hold at once
+    socks = [connect(PORT) for i in range(N)]
+    for s in socks:
+        r = uasyncio.StreamReader(s)
+        assert (yield from r.read()) == b"hi"
+        yield from r.aclose()
+
+
+def test_max_conns():
+    conns = []
+    server = uasyncio.start_server(lambda r, w: wait_line(r, w, conns),
+        "127.0.0.1", PORT + 1, max_conns=2)
+    loop = uasyncio.get_event_loop()
+    loop.create_task(server)
+    yield from uasyncio.sleep_ms(10)
+    socks = [connect(PORT + 1) for i in range(3)]
+    yield from uasyncio.sleep_ms(50)
+    assert len(conns) == 2, conns
+    # Closing a connection lets the next one in
+    socks[0].write(b"\n")
+    yield from uasyncio.sleep_ms(50)
+    assert len(conns) == 2, conns
+    for s in socks[1:]:
+        s.write(b"\n")
+    yield from uasyncio.sleep_ms(50)
+    assert not conns, conns
+
+    # Server paused at the limit is cancelled right away, and closes its
+    # socket
+    socks = [connect(PORT + 1) for i in range(2)]
+    yield from uasyncio.sleep_ms(50)
+    assert len(conns) == 2, conns
+    uasyncio.cancel(server)
+    yield from uasyncio.sleep_ms(10)
+    try:
+        connect(PORT + 1)
+        assert False, "server socket not closed"
+    except OSError:
+        pass
+    for s in socks:
+        s.write(b"\n")
+    yield from uasyncio.sleep_ms(50)
+    assert not conns, conns
+    for s in socks:
+        s.close()
+
+
+def main():
+    loop = uasyncio.get_event_loop()
+    loop.create_task(uasyncio.start_server(hello, "127.0.0.1", PORT, backlog=N))
+    yield from uasyncio.sleep_ms(10)
+    yield from test_batch()
+    assert loop.runq_hwm <= loop.runq_len
+    yield from test_max_conns()
+
+
+uasyncio.get_event_loop().run_until_complete(main())
+print("OK")
@@ -0,0 +1,71 @@
+# Test TLS client and server streams, with self-signed certificate
+# (generated with:
+# openssl req -x509 -newkey rsa:2048 -nodes -subj "/CN=localhost" ...)
+import uasyncio
+
+
+ADDR = ("127.0.0.1", 8443)
+
+with open("test_tls_key.der", "rb") as f:
+    key = f.read()
+with open("test_tls_cert.der", "rb") as f:
+    cert = f.read()
+
+
+conns = []
+
+
+def echo_server(reader, writer):
+    conns.append(writer)
+    while True:
+        l = yield from reader.readline()
+        if not l:
+            break
+        yield from writer.awrite(l)
+    yield from writer.aclose()
+
+
+def client(result):
+    yield from uasyncio.sleep_ms(10)
+    # Failed handshake closes the connection, without affecting the
+    # server
+    reader, writer = yield from uasyncio.open_connection(*ADDR)
+    yield from writer.awrite(b"GET / HTTP/1.0\r\n\r\n")
+    result.append((yield from reader.read()))
+    yield from writer.aclose()
+    assert not conns
+
+    reader, writer = yield from uasyncio.open_connection(*ADDR, ssl=True)
+    # Handshake is complete on return (and then on server side too, which
+    # starts the handler), without any I/O on the stream
+    yield from uasyncio.sleep_ms(50)
+    assert conns
+    for l in (b"Hello\n", b"x" * 2000 + b"\n"):
+        yield from writer.awrite(l)
+        result.append((yield from reader.readline()))
+    # Data buffered in TLS layer is read without waiting for the socket
+    yield from writer.awrite(b"a\nb\n")
+    result.append((yield from reader.readexactly(2)))
+    result.append((yield from reader.readexactly(2)))
+    yield from writer.aclose()
+
+    # Server speaks first
+    reader, writer = yield from uasyncio.open_connection(ADDR[0], ADDR[1] + 1, ssl=True)
+    result.append((yield from uasyncio.wait_for_ms(reader.readline(), 2000)))
+    yield from writer.aclose()
+
+
+def banner_server(reader, writer):
+    yield from writer.awrite(b"220 ready\n")
+    yield from reader.read()
+    yield from writer.aclose()
+
+
+result = []
+loop = uasyncio.get_event_loop()
+tls = {"key": key, "cert": cert}
+loop.create_task(uasyncio.start_server(echo_server, *ADDR, ssl=tls))
+loop.create_task(uasyncio.start_server(banner_server, ADDR[0], ADDR[1] + 1, ssl=tls))
+loop.run_until_complete(client(result))
+assert result == [b"", b"Hello\n", b"x" * 2000 + b"\n", b"a\n", b"b\n", b"220 ready\n"], result
+print("OK")
@@ -0,0 +1,77 @@
+import os
+import uasyncio
+
+
+PATH = "/tmp/uasyncio_test.sock"
+
+
+def echo(reader, writer):
+    while True:
+        l = yield from reader.readline()
+        if not l:
+            break
+        yield from writer.awrite(l)
+    yield from writer.aclose()
+
+
+def unix_client():
+    r, w = yield from uasyncio.open_unix_connection(PATH)
+    for i in range(3):
+        yield from w.awrite(b"line %d\n" % i)
+        assert (yield from r.readline()) == b"line %d\n" % i
+    yield from w.aclose()
+
+
+# A file at path which isn't a socket is left alone
+with open(PATH, "w") as f:
+    f.write("data")
+try:
+    next(uasyncio.start_unix_server(echo, PATH))
+    assert False, "non-socket file replaced"
+except OSError:
+    pass
+with open(PATH) as f:
+    assert f.read() == "data"
+os.remove(PATH)
+
+loop = uasyncio.get_event_loop()
+server = uasyncio.start_unix_server(echo, PATH)
+loop.create_task(server)
+loop.run_until_complete(unix_client())
+# Socket file left by a stopped server is replaced
+uasyncio.cancel(server)
+loop.create_task(uasyncio.start_unix_server(echo, PATH))
+loop.run_until_complete(unix_client())
+os.remove(PATH)
+
+
+# Pipe streams
+rfd, wfd = os.pipe()
+preader = uasyncio.open_fd_reader(rfd)
+pwriter = uasyncio.open_fd_writer(wfd)
+
+
+def producer():
+    for i in range(100):
+        pwriter.write(b"%d\n" % i)
+        if i % 10 == 0:
+            yield from pwriter.drain()
+            yield from uasyncio.sleep_ms(1)
+    yield from pwriter.aclose()
+
+
+def consumer():
+    n = 0
+    while True:
+        l = yield from preader.readline()
+        if not l:
+            break
+        assert l == b"%d\n" % n, l
+        n += 1
+    assert n == 100, n
+    yield from preader.aclose()
+
+
+loop.create_task(producer())
+loop.run_until_complete(consumer())
+print("OK")
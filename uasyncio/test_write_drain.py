@@ -0,0 +1,80 @@
+import uasyncio
+from uasyncio import StreamWriter
+
+
+class MockSock:
+
+    def __init__(self, max_write=-1):
+        self.max_write = max_write
+        self.writes = []
+
+    def write(self, buf, off=0, sz=-1):
+        if sz == -1:
+            sz = len(buf) - off
+        if 0 <= self.max_write < sz:
+            sz = self.max_write
+        self.writes.append(bytes(buf[off:off + sz]))
+        return sz
+
+
+mock = MockSock()
+sw = StreamWriter(mock, {})
+
+
+def func():
+    # Small writes are coalesced into one syscall
+    sw.write(b"HTTP/1.0 200 OK\r\n")
+    sw.write(b"Content-Type: text/plain\r\n\r\n")
+    sw.write(b"x" * 300)
+    await sw.drain()
+    assert mock.writes == [b"HTTP/1.0 200 OK\r\nContent-Type: text/plain\r\n\r\n" + b"x" * 300], mock.writes
+    # Buffer is reused, and is flushed by the loop without drain()
+    sw.write(b"abc")
+    sw.write(b"def")
+    assert len(mock.writes) == 1
+    await uasyncio.sleep_ms(0)
+    assert mock.writes[1] == b"abcdef", mock.writes
+
+uasyncio.get_event_loop().run_until_complete(func())
+assert sw.get_write_buffer_size() == 0
+
+
+# Partial writes: drain() doesn't wait while below high watermark, and
+# waits until low watermark is reached otherwise.
+mock = MockSock(4)
+sw = StreamWriter(mock, {})
+sw.set_write_buffer_limits(8)
+assert sw.low == 2
+sw.write(b"0123456789")
+for v in sw.drain():
+    pass
+assert sw.get_write_buffer_size() == 6
+sw.write(b"abcdefgh")
+n = 0
+for v in sw.drain():
+    n += 1
+assert n == 2, n
+assert sw.get_write_buffer_size() == 2
+
+# awrite() flushes write() buffer first
+for v in sw.awrite(b"!"):
+    pass
+assert sw.get_write_buffer_size() == 0
+assert b"".join(mock.writes) == b"0123456789abcdefgh!", mock.writes
+
+# Data of write() while awrite() waits isn't flushed in the middle of
+# awrite() data
+mock = MockSock(4)
+sw = StreamWriter(mock, {})
+g = sw.awrite(b"0123456789")
+next(g)
+sw.write(b"xy")
+assert not sw.flush_pending
+for v in g:
+    pass
+assert sw.flush_pending
+for v in sw.drain():
+    pass
+assert b"".join(mock.writes) == b"0123456789xy", mock.writes
+
+print("OK")
@@ -0,0 +1,78 @@
+# Test flushing of StreamWriter.write() buffers on real sockets in
+# default, one-shot poll mode: more writers than runq and waitq of the
+# default loop (runq_len=16, waitq_len=16) can hold entries for, with
+# stream buffers too small for the data. Expects the default event loop.
+import usocket
+import uasyncio
+
+
+PORT = 8086
+N = 20
+SIZE = 64 * 1024
+# Linux values, if not defined by usocket
+SO_SNDBUF = getattr(usocket, "SO_SNDBUF", 7)
+SO_RCVBUF = getattr(usocket, "SO_RCVBUF", 8)
+
+
+def make_pairs(n):
+    # Connected pairs of sockets with small buffers, so SIZE bytes don't
+    # fit into them
+    srv = usocket.socket()
+    srv.setsockopt(usocket.SOL_SOCKET, usocket.SO_REUSEADDR, 1)
+    srv.setsockopt(usocket.SOL_SOCKET, SO_RCVBUF, 4096)
+    addr = usocket.getaddrinfo("127.0.0.1", PORT)[0][-1]
+    srv.bind(addr)
+    srv.listen(n)
+    pairs = []
+    for i in range(n):
+        a = usocket.socket()
+        a.setsockopt(usocket.SOL_SOCKET, SO_SNDBUF, 4096)
+        a.connect(addr)
+        b = srv.accept()[0]
+        a.setblocking(False)
+        b.setblocking(False)
+        pairs.append((a, b))
+    srv.close()
+    return pairs
+
+
+def peer(b, res):
+    r = uasyncio.StreamReader(b)
+    got = 0
+    while True:
+        data = yield from r.read(4096)
+        if not data:
+            break
+        got += len(data)
+    res.append(got)
+    yield from r.aclose()
+
+
+def main():
+    pairs = make_pairs(N)
+    writers = [uasyncio.StreamWriter(a, {}) for a, b in pairs]
+    loop = uasyncio.get_event_loop()
+    # All writers are flushed by a single callback
+    for w in writers:
+        w.write(b"x" * SIZE)
+    assert len(loop.runq) <= 2, len(loop.runq)
+    yield from uasyncio.sleep_ms(10)
+    for w in writers:
+        assert 0 < w.get_write_buffer_size() < SIZE
+        # Nothing is left scheduled for a stream which isn't writable
+        assert not w.flush_pending
+    assert not loop.waitq
+    # The rest is flushed by drain()
+    res = []
+    for i in range(N):
+        loop.create_task(peer(pairs[i][1], res))
+        yield from writers[i].aclose()
+    for i in range(100):
+        if len(res) == N:
+            break
+        yield from uasyncio.sleep_ms(10)
+    assert res == [SIZE] * N, res
+
+
+uasyncio.get_event_loop().run_until_complete(main())
+print("OK")
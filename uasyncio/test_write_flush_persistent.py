@@ -0,0 +1,88 @@
+# Test background flush of StreamWriter.write() buffers on real sockets
+# in persistent poll mode: the loop keeps flushing a stream which isn't
+# writable, while a task waits to read from the same stream, and for
+# more writers than runq and waitq of the default loop can hold entries
+# for.
+import usocket
+import uasyncio
+
+
+PORT = 8091
+N = 20
+SIZE = 64 * 1024
+# Linux values, if not defined by usocket
+SO_SNDBUF = getattr(usocket, "SO_SNDBUF", 7)
+SO_RCVBUF = getattr(usocket, "SO_RCVBUF", 8)
+
+
+def make_pairs(n):
+    # Connected pairs of sockets with small buffers, so SIZE bytes don't
+    # fit into them
+    srv = usocket.socket()
+    srv.setsockopt(usocket.SOL_SOCKET, usocket.SO_REUSEADDR, 1)
+    srv.setsockopt(usocket.SOL_SOCKET, SO_RCVBUF, 4096)
+    addr = usocket.getaddrinfo("127.0.0.1", PORT)[0][-1]
+    srv.bind(addr)
+    srv.listen(n)
+    pairs = []
+    for i in range(n):
+        a = usocket.socket()
+        a.setsockopt(usocket.SOL_SOCKET, SO_SNDBUF, 4096)
+        a.connect(addr)
+        b = srv.accept()[0]
+        a.setblocking(False)
+        b.setblocking(False)
+        pairs.append((a, b))
+    srv.close()
+    return pairs
+
+
+def reader_task(r, res):
+    res.append((yield from uasyncio.wait_for_ms(r.read(10), 5000)))
+
+
+def drain_peers(pairs):
+    # Read all peers from this task, so runq doesn't fill up
+    got = [0] * len(pairs)
+    for i in range(500):
+        for j in range(len(pairs)):
+            data = pairs[j][1].read(4096)
+            if data:
+                got[j] += len(data)
+        if got == [SIZE] * len(pairs):
+            break
+        yield from uasyncio.sleep_ms(1)
+    return got
+
+
+def main():
+    pairs = make_pairs(N)
+    loop = uasyncio.get_event_loop()
+    writers = [uasyncio.StreamWriter(a, {}) for a, b in pairs]
+    # Reader waits on the first stream before and during the flush
+    res = []
+    loop.create_task(reader_task(uasyncio.StreamReader(pairs[0][0]), res))
+    yield
+    # Flushed by the loop without drain()
+    for w in writers:
+        w.write(b"x" * SIZE)
+    yield from uasyncio.sleep_ms(10)
+    for w in writers:
+        assert w.flush_pending
+    got = yield from drain_peers(pairs)
+    assert got == [SIZE] * N, got
+    for w in writers:
+        assert not w.flush_pending and not w.get_write_buffer_size()
+    pairs[0][1].write(b"pong")
+    yield from uasyncio.sleep_ms(10)
+    assert res == [b"pong"], res
+    for w in writers:
+        yield from w.aclose()
+    for a, b in pairs:
+        b.close()
+
+
+loop = uasyncio.get_event_loop()
+loop.set_persistent(True)
+loop.run_until_complete(main())
+print("OK")
@@ -15,17 +15,242 @@ def set_debug(val):
         log = logging.getLogger("uasyncio")
 
 
+try:
+    import _thread
+except ImportError:
+    _thread = None
+
+
+def _make_wakeup():
+    # Return (reader, writer) file objects to wake up the loop from other
+    # threads: both are the same eventfd if available, or ends of a pipe.
+    try:
+        import ffilib
+        libc = ffilib.libc()
+        if libc:
+            # EFD_NONBLOCK
+            fd = libc.func("i", "eventfd", "ii")(0, 0o4000)
+            if fd >= 0:
+                f = open(fd, "r+b", 0)
+                return f, f
+    except (ImportError, OSError):
+        pass
+    import os
+    r, w = os.pipe()
+    return _open_fd(r, "rb"), _open_fd(w, "wb")
+
+
+class _Job:
+
+    def __init__(self, fn, args, task):
+        self.fn = fn
+        self.args = args
+        # Task waiting for the result, None if it was cancelled
+        self.task = task
+        self.done = False
+        self.res = None
+        self.exc = None
+
+
+def _job_done(job):
+    # Called in the loop thread
+    job.done = True
+    if job.task is not None:
+        resume(job.task)
+
+
+class _ThreadPool:
+    # Up to n worker threads, started on demand. An idle worker blocks on
+    # its own (held) lock, which is released to hand it a job.
+
+    def __init__(self, loop, n):
+        self.loop = loop
+        self.max = n
+        self.nthreads = 0
+        self.jobs = []
+        self.idle = []
+        self.lock = _thread.allocate_lock()
+
+    def submit(self, job):
+        with self.lock:
+            self.jobs.append(job)
+            if self.idle:
+                self.idle.pop().release()
+            elif self.nthreads < self.max:
+                self.nthreads += 1
+                _thread.start_new_thread(self._worker, ())
+
+    def _worker(self):
+        l = _thread.allocate_lock()
+        l.acquire()
+        while True:
+            with self.lock:
+                if self.jobs:
+                    job = self.jobs.pop(0)
+                else:
+                    self.idle.append(l)
+                    job = None
+            if job is None:
+                l.acquire()
+                continue
+            try:
+                job.res = job.fn(*job.args)
+            except Exception as e:
+                job.exc = e
+            self.loop.call_soon_threadsafe(_job_done, job)
+
+
+def _ts_wakeup_cb(loop):
+    # (I/O callbacks are registered with args, to tell them from tasks)
+    loop._ts_wakeup()
+
+
 class PollEventLoop(EventLoop):
 
-    def __init__(self, runq_len=16, waitq_len=16):
-        EventLoop.__init__(self, runq_len, waitq_len)
+    # Max number of threads of run_in_executor()
+    executor_workers = 4
+
+    def __init__(self, runq_len=16, waitq_len=16, timer_wheel=False, runq_grow=False):
+        EventLoop.__init__(self, runq_len, waitq_len, timer_wheel, runq_grow)
         self.poller = select.poll()
         self.objmap = {}
+        self.persistent = False
+        # For call_soon_threadsafe(): (reader, writer) of wakeup fd, and
+        # queue of callbacks with args
+        self.wakeup = None
+        self.ts_q = []
+        self.ts_lock = _thread.allocate_lock() if _thread else None
+        self.executor = None
+        # StreamWriters with write() buffer to flush, served by a single
+        # callback per loop iteration
+        self.flushq = []
+
+    def call_soon_threadsafe(self, callback, *args):
+        # Schedule callback from another thread. The loop is woken up by
+        # a write to eventfd (or self-pipe), which is set up on first call
+        # (or run_in_executor()). That first call must be made from the
+        # loop thread, or while the loop isn't running.
+        if self.wakeup is None:
+            self._init_wakeup()
+        lock = self.ts_lock
+        if lock:
+            lock.acquire()
+        q = self.ts_q
+        q.append((callback, args))
+        first = len(q) == 1
+        if lock:
+            lock.release()
+        if first:
+            try:
+                self.wakeup[1].write(b"\x01\0\0\0\0\0\0\0")
+            except OSError:
+                # Full, the loop will wake up anyway
+                pass
+
+    def _init_wakeup(self):
+        lock = self.ts_lock
+        if lock:
+            lock.acquire()
+        if self.wakeup is None:
+            self.wakeup = _make_wakeup()
+            self.add_reader(self.wakeup[0], _ts_wakeup_cb, self)
+        if lock:
+            lock.release()
+
+    def _ts_wakeup(self):
+        r = self.wakeup[0]
+        try:
+            r.read(64)
+        except OSError:
+            pass
+        lock = self.ts_lock
+        if lock:
+            lock.acquire()
+        q = self.ts_q
+        self.ts_q = []
+        if lock:
+            lock.release()
+        for cb, args in q:
+            self.call_soon(cb, *args)
+        self.add_reader(r, _ts_wakeup_cb, self)
+
+    def _flush_soon(self, writer):
+        q = self.flushq
+        q.append(writer)
+        if len(q) == 1:
+            self.call_soon(_flush_cb, self)
+
+    def _flush_writers(self):
+        q = self.flushq
+        self.flushq = []
+        for writer in q:
+            writer.flush_pending = False
+            writer._bg_flush()
+
+    def run_in_executor(self, fn, *args):
+        # Coroutine running blocking fn(*args) in a worker thread, and
+        # returning its result (or raising its exception). If threads
+        # aren't supported by the port, fn is just called.
+        if not _thread:
+            return fn(*args)
+        if self.wakeup is None:
+            self._init_wakeup()
+        if self.executor is None:
+            self.executor = _ThreadPool(self, self.executor_workers)
+        job = _Job(fn, args, self.cur_task)
+        self.executor.submit(job)
+        while not job.done:
+            try:
+                yield from suspend()
+            except:
+                # Result will be discarded
+                job.task = None
+                raise
+        if job.exc is not None:
+            raise job.exc
+        return job.res
+
+    def set_persistent(self, val):
+        # In persistent mode, a stream stays registered with the poller
+        # (with separate reader and writer waiters) until IOReadDone/
+        # IOWriteDone, and poller registration is modified only when the
+        # set of events of interest changes, instead of re-arming it for
+        # each IORead/IOWrite. Must be set before any I/O is scheduled.
+        assert not self.objmap
+        self.persistent = val
+
+    def _add_waiter(self, sock, cb, args, idx, ev):
+        # objmap value in persistent mode: [reader cb, writer cb, eventmask]
+        e = self.objmap.get(id(sock))
+        if e is None:
+            e = self.objmap[id(sock)] = [None, None, 0]
+        if args:
+            cb = (cb, args)
+        e[idx] = cb
+        if not e[2] & ev:
+            e[2] |= ev
+            self.poller.register(sock, e[2])
+
+    def _remove_waiter(self, sock, idx, ev):
+        e = self.objmap.get(id(sock))
+        if e is None:
+            return
+        e[idx] = None
+        if e[1 - idx] is None:
+            # Stream is done with (e.g. is being closed), don't leave it
+            # registered even if other event is still (lazily) polled for.
+            self.poller.unregister(sock)
+            del self.objmap[id(sock)]
+        else:
+            e[2] &= ~ev
+            self.poller.modify(sock, e[2])
 
     def add_reader(self, sock, cb, *args):
         if DEBUG and __debug__:
             log.debug("add_reader%s", (sock, cb, args))
-        if args:
+        if self.persistent:
+            self._add_waiter(sock, cb, args, 0, select.POLLIN)
+        elif args:
             self.poller.register(sock, select.POLLIN)
             self.objmap[id(sock)] = (cb, args)
         else:
@@ -35,13 +260,25 @@ class PollEventLoop(EventLoop):
     def remove_reader(self, sock):
         if DEBUG and __debug__:
             log.debug("remove_reader(%s)", sock)
-        self.poller.unregister(sock)
-        del self.objmap[id(sock)]
+        if self.persistent:
+            self._remove_waiter(sock, 0, select.POLLIN)
+            return
+        try:
+            self.poller.unregister(sock)
+            self.objmap.pop(id(sock), None)
+        except OSError as e:
+            # wait() already unregisters a stream on POLLHUP/POLLERR
+            # (e.g. a pipe whose write end was closed), so IOReadDone on
+            # EOF finds it not registered.
+            if e.args[0] != uerrno.ENOENT:
+                raise
 
     def add_writer(self, sock, cb, *args):
         if DEBUG and __debug__:
             log.debug("add_writer%s", (sock, cb, args))
-        if args:
+        if self.persistent:
+            self._add_waiter(sock, cb, args, 1, select.POLLOUT)
+        elif args:
             self.poller.register(sock, select.POLLOUT)
             self.objmap[id(sock)] = (cb, args)
         else:
@@ -51,6 +288,9 @@ class PollEventLoop(EventLoop):
     def remove_writer(self, sock):
         if DEBUG and __debug__:
             log.debug("remove_writer(%s)", sock)
+        if self.persistent:
+            self._remove_waiter(sock, 1, select.POLLOUT)
+            return
         try:
             self.poller.unregister(sock)
             self.objmap.pop(id(sock), None)
@@ -62,9 +302,59 @@ class PollEventLoop(EventLoop):
             if e.args[0] != uerrno.ENOENT:
                 raise
 
+    def _wake(self, cb):
+        if DEBUG and __debug__:
+            log.debug("Calling IO callback: %r", cb)
+        if isinstance(cb, tuple):
+            cb[0](*cb[1])
+        else:
+            resume(cb)
+
+    def wait_persistent(self, delay):
+        res = self.poller.ipoll(delay)
+        if res:
+            for sock, ev in res:
+                e = self.objmap.get(id(sock))
+                if e is None:
+                    # Removed by a callback woken up earlier
+                    continue
+                rcb = e[0]
+                wcb = e[1]
+                if ev & (select.POLLHUP | select.POLLERR):
+                    # Sticky events, see wait() below. Wake up all
+                    # waiters, so they can see the error.
+                    self.poller.unregister(sock)
+                    del self.objmap[id(sock)]
+                    if rcb is not None:
+                        self._wake(rcb)
+                    if wcb is not None:
+                        self._wake(wcb)
+                    continue
+                # Events are level-triggered: if there's no waiter for a
+                # ready event (woken task didn't yet come back for more),
+                # stop polling for it until there is.
+                mask = e[2]
+                if ev & select.POLLIN:
+                    if rcb is None:
+                        mask &= ~select.POLLIN
+                    else:
+                        e[0] = None
+                        self._wake(rcb)
+                if ev & select.POLLOUT:
+                    if wcb is None:
+                        mask &= ~select.POLLOUT
+                    else:
+                        e[1] = None
+                        self._wake(wcb)
+                if mask != e[2]:
+                    e[2] = mask
+                    self.poller.modify(sock, mask)
+
     def wait(self, delay):
         if DEBUG and __debug__:
             log.debug("poll.wait(%d)", delay)
+        if self.persistent:
+            return self.wait_persistent(delay)
         # We need one-shot behavior (second arg of 1 to .poll())
         res = self.poller.ipoll(delay, 1)
         #log.debug("poll result: %s", res)
@@ -85,21 +375,67 @@ class PollEventLoop(EventLoop):
                 if isinstance(cb, tuple):
                     cb[0](*cb[1])
                 else:
-                    cb.pend_throw(None)
-                    self.call_soon(cb)
+                    resume(cb)
 
 
 class StreamReader:
 
+    # Size of read-ahead chunks for readuntil()
+    readahead = 512
+
     def __init__(self, polls, ios=None):
         if ios is None:
             ios = polls
         self.polls = polls
         self.ios = ios
+        # Data read ahead by readuntil() and not yet consumed, starting
+        # at offset self.bpos. It's a bytes object (not a reusable
+        # bytearray), as we need .find() on it. Always consumed before
+        # reading from the stream by all methods.
+        self.buf = b""
+        self.bpos = 0
+        # Wrapped streams (ssl, websockets, etc.) may have data buffered
+        # internally, which doesn't make the underlying stream readable,
+        # so for them, reading is tried before waiting for it.
+        self.wrapped = ios is not polls
+
+    def _buffered(self, n):
+        # Take up to n (all if n < 0) bytes of read-ahead data
+        buf = self.buf
+        pos = self.bpos
+        end = len(buf)
+        if 0 <= n < end - pos:
+            end = pos + n
+            self.bpos = end
+        else:
+            self.buf = b""
+            self.bpos = 0
+            if not pos:
+                return buf
+        return buf[pos:end]
+
+    def _buffered_into(self, mv):
+        # Copy up to len(mv) bytes of read-ahead data to memoryview mv
+        pos = self.bpos
+        n = len(self.buf) - pos
+        if n > len(mv):
+            n = len(mv)
+        mv[:n] = memoryview(self.buf)[pos:pos + n]
+        pos += n
+        if pos == len(self.buf):
+            self.buf = b""
+            pos = 0
+        self.bpos = pos
+        return n
 
     def read(self, n=-1):
+        if self.buf:
+            return self._buffered(n)
+        w = not self.wrapped
         while True:
-            yield IORead(self.polls)
+            if w:
+                yield IORead(self.polls)
+            w = True
             res = self.ios.read(n)
             if res is not None:
                 break
@@ -110,33 +446,147 @@ class StreamReader:
             yield IOReadDone(self.polls)
         return res
 
+    def readinto(self, buf):
+        # Read available data into buf (bytearray or memoryview), without
+        # allocation. Returns number of bytes read, 0 on EOF.
+        if self.buf:
+            return self._buffered_into(memoryview(buf))
+        w = not self.wrapped
+        while True:
+            if w:
+                yield IORead(self.polls)
+            w = True
+            res = self.ios.readinto(buf)
+            if res is not None:
+                break
+        if not res:
+            yield IOReadDone(self.polls)
+        return res
+
+    def readexactly_into(self, buf):
+        # Fill buf (bytearray or memoryview) completely, reading data
+        # directly into it. Returns number of bytes read, which is less
+        # than len(buf) only on EOF.
+        mv = memoryview(buf)
+        n = len(mv)
+        pos = 0
+        if self.buf:
+            pos = self._buffered_into(mv)
+        w = not self.wrapped
+        while pos < n:
+            if w:
+                yield IORead(self.polls)
+            w = True
+            res = self.ios.readinto(mv[pos:])
+            if res is None:
+                continue
+            if not res:
+                yield IOReadDone(self.polls)
+                break
+            pos += res
+        return pos
+
     def readexactly(self, n):
-        buf = b""
+        parts = []
+        if self.buf:
+            res = self._buffered(n)
+            parts.append(res)
+            n -= len(res)
+        w = not self.wrapped
         while n:
-            yield IORead(self.polls)
+            if w:
+                yield IORead(self.polls)
+            w = True
             res = self.ios.read(n)
-            assert res is not None
+            if res is None:
+                continue
             if not res:
                 yield IOReadDone(self.polls)
                 break
-            buf += res
+            parts.append(res)
             n -= len(res)
-        return buf
+        if len(parts) == 1:
+            return parts[0]
+        return b"".join(parts)
+
+    def readuntil(self, sep=b"\n", limit=-1):
+        # Read data up to and including sep, or until EOF. Data is read
+        # in chunks of up to self.readahead bytes, one read per poll
+        # wakeup; data past sep is kept for subsequent reads. If limit
+        # isn't negative and sep isn't found within limit bytes,
+        # ValueError is raised.
+        parts = []
+        total = 0
+        seplen = len(sep)
+        # Last seplen - 1 bytes of data consumed so far, to find sep
+        # spanning chunks.
+        tail = b""
+        w = not self.wrapped
+        while True:
+            buf = self.buf
+            if buf:
+                pos = self.bpos
+                end = -1
+                if tail:
+                    i = (tail + buf[pos:pos + seplen - 1]).find(sep)
+                    if i >= 0:
+                        end = pos + i + seplen - len(tail)
+                if end < 0:
+                    i = buf.find(sep, pos)
+                    if i >= 0:
+                        end = i + seplen
+                if end >= 0:
+                    total += end - pos
+                    if 0 <= limit < total:
+                        raise ValueError("separator not found within limit")
+                    parts.append(self._buffered(end - pos))
+                    break
+                part = self._buffered(-1)
+                parts.append(part)
+                total += len(part)
+                if 0 <= limit < total:
+                    raise ValueError("separator not found within limit")
+                if seplen > 1:
+                    tail = (tail + part)[1 - seplen:]
+            if w:
+                yield IORead(self.polls)
+            w = True
+            res = self.ios.read(self.readahead)
+            if res is None:
+                continue
+            if not res:
+                yield IOReadDone(self.polls)
+                break
+            self.buf = res
+            self.bpos = 0
+        if len(parts) == 1:
+            return parts[0]
+        return b"".join(parts)
 
     def readline(self):
         if DEBUG and __debug__:
             log.debug("StreamReader.readline()")
-        buf = b""
+        if self.buf:
+            return (yield from self.readuntil())
+        parts = []
+        w = not self.wrapped
         while True:
-            yield IORead(self.polls)
+            if w:
+                yield IORead(self.polls)
+            w = True
             res = self.ios.readline()
-            assert res is not None
+            if res is None:
+                continue
             if not res:
                 yield IOReadDone(self.polls)
                 break
-            buf += res
-            if buf[-1] == 0x0a:
+            parts.append(res)
+            if res[-1] == 0x0a:
                 break
+        if len(parts) == 1:
+            buf = parts[0]
+        else:
+            buf = b"".join(parts)
         if DEBUG and __debug__:
             log.debug("StreamReader.readline(): %s", buf)
         return buf
@@ -149,40 +599,292 @@ class StreamReader:
         return "<StreamReader %r %r>" % (self.polls, self.ios)
 
 
+# sendfile() from libc, if available (False if not, None if not looked
+# up yet)
+_sendfile = None
+
+
+def _get_sendfile():
+    global _sendfile
+    if _sendfile is None:
+        _sendfile = False
+        try:
+            import ffilib
+            libc = ffilib.libc()
+            if libc:
+                _sendfile = libc.func("i", "sendfile", "iiPi")
+        except (ImportError, OSError):
+            pass
+    return _sendfile
+
+
+def _flush_cb(loop):
+    loop._flush_writers()
+
+
+def _writable_cb(writer):
+    # Stream with pending background flush is writable (persistent mode)
+    writer.flush_pending = False
+    writer._bg_flush()
+
+
 class StreamWriter:
 
+    # Initial size of write() buffer
+    bufsize = 256
+    # If more than high watermark bytes are buffered by write(), drain()
+    # waits until there're no more than low watermark bytes.
+    high = 16384
+    low = 4096
+    # Size of buffer for asendfile() when sendfile() isn't available
+    sendbufsize = 1024
+
     def __init__(self, s, extra):
         self.s = s
         self.extra = extra
+        # write() buffer, allocated on first use and then reused. Data
+        # pending to be written is self.wbuf[self.wpos:self.wend].
+        self.wbuf = None
+        self.wpos = 0
+        self.wend = 0
+        # Flush of write() buffer is scheduled in the loop
+        self.flush_pending = False
+        self.draining = False
+        # Error of background flush, raised by next write()/drain()
+        self.error = None
+        # asendfile() buffer, allocated on first use
+        self.sendbuf = None
+
+    def set_write_buffer_limits(self, high=None, low=None):
+        if high is None:
+            high = 4 * low if low is not None else self.high
+        if low is None:
+            low = high // 4
+        assert 0 <= low <= high
+        self.high = high
+        self.low = low
+
+    def get_write_buffer_size(self):
+        return self.wend - self.wpos
+
+    def write(self, buf):
+        # Unlike awrite(), not a coroutine: data is appended to a buffer,
+        # which is flushed with a single write syscall on the next loop
+        # iteration (or by drain()), so many small writes are coalesced.
+        # As the buffer isn't limited, producers of any considerable
+        # amount of data should call drain() to apply flow control.
+        if self.error:
+            e = self.error
+            self.error = None
+            raise e
+        n = len(buf)
+        wbuf = self.wbuf
+        end = self.wend
+        if wbuf is None or end + n > len(wbuf):
+            wbuf = self._grow_wbuf(n)
+            end = self.wend
+        wbuf[end:end + n] = buf
+        self.wend = end + n
+        if not self.flush_pending and not self.draining:
+            self.flush_pending = True
+            get_event_loop()._flush_soon(self)
+
+    def _grow_wbuf(self, n):
+        pos = self.wpos
+        pending = self.wend - pos
+        size = self.bufsize
+        if self.wbuf is not None:
+            size = len(self.wbuf)
+        if pending + n <= size and self.wbuf is not None:
+            # Enough space, just move pending data to the beginning
+            wbuf = self.wbuf
+            wbuf[:pending] = memoryview(wbuf)[pos:self.wend]
+        else:
+            while size < pending + n:
+                size *= 2
+            wbuf = bytearray(size)
+            if pending:
+                wbuf[:pending] = memoryview(self.wbuf)[pos:self.wend]
+            self.wbuf = wbuf
+        self.wpos = 0
+        self.wend = pending
+        return wbuf
+
+    def _flush(self):
+        # Write out as much of the buffer as the stream accepts
+        sz = self.wend - self.wpos
+        if not sz:
+            return
+        res = self.s.write(self.wbuf, self.wpos, sz)
+        if DEBUG and __debug__:
+            log.debug("StreamWriter._flush(): %s of %d bytes", res, sz)
+        if res == sz:
+            self.wpos = self.wend = 0
+        elif res:
+            self.wpos += res
+
+    def _bg_flush(self):
+        # Flush write() buffer from the loop
+        if self.draining:
+            # drain() is in charge
+            return
+        try:
+            self._flush()
+        except OSError as e:
+            # Don't let it propagate into the loop, report from next
+            # write()/drain() instead.
+            self.error = e
+            self.wpos = self.wend = 0
+            return
+        if self.wend:
+            loop = get_event_loop()
+            if loop.persistent:
+                # Stream buffer is full, continue when it's writable
+                self.flush_pending = True
+                loop.add_writer(self.s, _writable_cb, self)
+            # In one-shot poll mode, a stream has a single registration,
+            # which would replace (or be replaced by) that of a task
+            # waiting to read from it, so the rest is left for the next
+            # write() or drain().
+
+    def drain(self):
+        # Flush write() buffer. If more than high watermark bytes remain
+        # pending, wait until the buffer is drained to low watermark.
+        yield from self._drain(self.high, self.low)
+
+    def _drain(self, high, low):
+        if self.error:
+            e = self.error
+            self.error = None
+            raise e
+        self._flush()
+        if self.wend - self.wpos <= high:
+            return
+        self.draining = True
+        try:
+            while self.wend - self.wpos > low:
+                yield IOWrite(self.s)
+                self._flush()
+        finally:
+            self.draining = False
+        self._resume_flush()
+
+    def _resume_flush(self):
+        # Our waiting for IOWrite replaced poller registration of
+        # background flush, if any. Reschedule it for data write()'n
+        # meanwhile.
+        self.flush_pending = False
+        if self.wend:
+            self.flush_pending = True
+            get_event_loop()._flush_soon(self)
 
     def awrite(self, buf, off=0, sz=-1):
         # This method is called awrite (async write) to not proliferate
         # incompatibility with original asyncio. Unlike original asyncio
         # whose .write() method is both not a coroutine and guaranteed
         # to return immediately (which means it has to buffer all the
-        # data), this method is a coroutine.
+        # data), this method is a coroutine. (Buffered write() is also
+        # provided, see above.)
+        if self.wend:
+            # Keep ordering with data buffered by write()
+            yield from self._drain(0, 0)
         if sz == -1:
             sz = len(buf) - off
         if DEBUG and __debug__:
             log.debug("StreamWriter.awrite(): spooling %d bytes", sz)
-        while True:
-            res = self.s.write(buf, off, sz)
-            # If we spooled everything, return immediately
-            if res == sz:
-                if DEBUG and __debug__:
-                    log.debug("StreamWriter.awrite(): completed spooling %d bytes", res)
-                return
-            if res is None:
-                res = 0
-            if DEBUG and __debug__:
-                log.debug("StreamWriter.awrite(): spooled partial %d bytes", res)
-            assert res < sz
-            off += res
-            sz -= res
-            yield IOWrite(self.s)
-            #assert s2.fileno() == self.s.fileno()
+        res = self.s.write(buf, off, sz)
+        # If we spooled everything, return immediately
+        if res == sz:
             if DEBUG and __debug__:
-                log.debug("StreamWriter.awrite(): can write more")
+                log.debug("StreamWriter.awrite(): completed spooling %d bytes", res)
+            return
+        # Data write()'n by other tasks while we wait must not be flushed
+        # in the middle of ours.
+        self.draining = True
+        try:
+            while True:
+                if res is None:
+                    res = 0
+                if DEBUG and __debug__:
+                    log.debug("StreamWriter.awrite(): spooled partial %d bytes", res)
+                assert res < sz
+                off += res
+                sz -= res
+                yield IOWrite(self.s)
+                #assert s2.fileno() == self.s.fileno()
+                if DEBUG and __debug__:
+                    log.debug("StreamWriter.awrite(): can write more")
+                res = self.s.write(buf, off, sz)
+                if res == sz:
+                    break
+        finally:
+            self.draining = False
+        self._resume_flush()
+
+    def asendfile(self, f, offset=0, count=-1):
+        # Send count bytes (until EOF if negative) of file f, starting at
+        # offset. Where sendfile() syscall is available (unix port with
+        # ffi), data is sent by the kernel without passing through Python
+        # heap, otherwise it's read in chunks into a reusable buffer.
+        # Returns number of bytes sent.
+        if self.wend:
+            yield from self._drain(0, 0)
+        f.seek(offset)
+        sent = 0
+        sendfile = _get_sendfile()
+        # Not for TLS connections, whose data must pass through ussl
+        if sendfile and isinstance(self.s, _socket.socket):
+            import uos
+            out = self.s.fileno()
+            fd = f.fileno()
+            # As with awrite(), hold off flushes of write() buffer
+            self.draining = True
+            try:
+                while count:
+                    n = 0x100000
+                    if 0 < count < n:
+                        n = count
+                    # With NULL offset, file position is used and updated
+                    res = sendfile(out, fd, None, n)
+                    if res < 0:
+                        e = uos.errno()
+                        if e == uerrno.EAGAIN:
+                            yield IOWrite(self.s)
+                            continue
+                        # EINTR
+                        if e == 4:
+                            continue
+                        # EINVAL or ENOSYS: file type isn't supported,
+                        # fall back to copying
+                        if (e == uerrno.EINVAL or e == 38) and not sent:
+                            break
+                        raise OSError(e)
+                    if not res:
+                        return sent
+                    sent += res
+                    if count > 0:
+                        count -= res
+                else:
+                    return sent
+            finally:
+                self.draining = False
+                self._resume_flush()
+        buf = self.sendbuf
+        if buf is None:
+            buf = self.sendbuf = bytearray(self.sendbufsize)
+        mv = memoryview(buf)
+        while count:
+            n = len(buf)
+            if 0 < count < n:
+                n = count
+            n = f.readinto(mv[:n])
+            if not n:
+                break
+            yield from self.awrite(buf, 0, n)
+            sent += n
+            if count > 0:
+                count -= n
+        return sent
 
     # Write piecewise content from iterable (usually, a generator)
     def awriteiter(self, iterable):
@@ -190,6 +892,8 @@ class StreamWriter:
             yield from self.awrite(buf)
 
     def aclose(self):
+        if self.wend:
+            yield from self._drain(0, 0)
         yield IOWriteDone(self.s)
         self.s.close()
 
@@ -200,15 +904,54 @@ class StreamWriter:
         return "<StreamWriter %r>" % self.s
 
 
-def open_connection(host, port, ssl=False):
-    if DEBUG and __debug__:
-        log.debug("open_connection(%s, %s)", host, port)
-    ai = _socket.getaddrinfo(host, port, 0, _socket.SOCK_STREAM)
-    ai = ai[0]
-    s = _socket.socket(ai[0], ai[1], ai[2])
+# mbedtls "want read/write" error codes, as raised by some versions of
+# ussl for non-blocking sockets.
+_TLS_WANT_READ = -0x6900
+_TLS_WANT_WRITE = -0x6880
+
+def _tls_handshake(sock, tls):
+    # Drive handshake of TLS stream tls, created by ussl.wrap_socket(...,
+    # do_handshake=False) over non-blocking sock, yielding IORead (or
+    # IOWrite if the TLS layer reports "want write") on sock until it's
+    # complete, on both client and server side.
+    #
+    # If tls has do_handshake(), it's retried until it succeeds.
+    # Otherwise, ussl performs handshake steps as part of I/O operations,
+    # so a zero-length write is issued instead, which returns None until
+    # the handshake is complete (and doesn't send any application data).
+    hs = getattr(tls, "do_handshake", None)
+    while True:
+        try:
+            if hs:
+                hs()
+                return
+            if tls.write(b"") is not None:
+                return
+            ev = IORead
+        except OSError as e:
+            if e.args[0] == _TLS_WANT_READ or e.args[0] == uerrno.EAGAIN:
+                ev = IORead
+            elif e.args[0] == _TLS_WANT_WRITE:
+                ev = IOWrite
+            else:
+                raise
+        if DEBUG and __debug__:
+            log.debug("_tls_handshake: waiting for %s", ev)
+        yield ev(sock)
+
+
+def _unix_addr(path):
+    # usocket takes raw struct sockaddr_un
+    if isinstance(path, str):
+        path = path.encode()
+    import ustruct
+    return ustruct.pack("H", _socket.AF_UNIX) + path + b"\0"
+
+
+def _connect(s, addr):
     s.setblocking(False)
     try:
-        s.connect(ai[-1])
+        s.connect(addr)
     except OSError as e:
         if e.args[0] != uerrno.EINPROGRESS:
             raise
@@ -219,17 +962,106 @@ def open_connection(host, port, ssl=False):
 #        assert s2.fileno() == s.fileno()
     if DEBUG and __debug__:
         log.debug("open_connection: After iowait: %s", s)
+
+
+def open_unix_connection(path):
+    # Connect to unix domain socket path. Unix port only.
+    if DEBUG and __debug__:
+        log.debug("open_unix_connection(%s)", path)
+    s = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    yield from _connect(s, _unix_addr(path))
+    return StreamReader(s), StreamWriter(s, {})
+
+
+def _set_nonblocking(fd):
+    import fcntl
+    import os
+    # F_GETFL, F_SETFL
+    fl = fcntl.fcntl(fd, 3)
+    fcntl.fcntl(fd, 4, fl | os.O_NONBLOCK)
+
+
+def _open_fd(fd, mode):
+    if isinstance(fd, int):
+        _set_nonblocking(fd)
+        return open(fd, mode, 0)
+    # File object
+    _set_nonblocking(fd.fileno())
+    return fd
+
+
+def open_fd_reader(fd):
+    # Return StreamReader for file descriptor or file object fd (a pipe,
+    # tty, etc.), which is switched to non-blocking mode. Unix port only.
+    return StreamReader(_open_fd(fd, "rb"))
+
+
+def open_fd_writer(fd):
+    # Return StreamWriter for file descriptor or file object fd, see
+    # open_fd_reader().
+    return StreamWriter(_open_fd(fd, "wb"), {})
+
+
+def open_connection(host, port, ssl=False):
+    # ssl may be True, or a dict of additional ussl.wrap_socket() params
+    if DEBUG and __debug__:
+        log.debug("open_connection(%s, %s)", host, port)
+    ai = _socket.getaddrinfo(host, port, 0, _socket.SOCK_STREAM)
+    ai = ai[0]
+    s = _socket.socket(ai[0], ai[1], ai[2])
+    yield from _connect(s, ai[-1])
     if ssl:
-        print("Warning: uasyncio SSL support is alpha")
         import ussl
-        s.setblocking(True)
-        s2 = ussl.wrap_socket(s)
-        s.setblocking(False)
+        kw = {"server_hostname": host}
+        if ssl is not True:
+            kw.update(ssl)
+        try:
+            s2 = ussl.wrap_socket(s, do_handshake=False, **kw)
+            yield from _tls_handshake(s, s2)
+        except:
+            yield IOWriteDone(s)
+            s.close()
+            raise
         return StreamReader(s, s2), StreamWriter(s2, {})
     return StreamReader(s), StreamWriter(s, {})
 
 
-def start_server(client_coro, host, port, backlog=10):
+def _tls_conn(client_coro, s, extra, ssl):
+    # Perform server-side TLS handshake for start_server() connection,
+    # as a part of connection's own task.
+    import ussl
+    try:
+        s2 = ussl.wrap_socket(s, server_side=True, do_handshake=False, **ssl)
+        yield from _tls_handshake(s, s2)
+    except OSError as e:
+        if DEBUG and __debug__:
+            log.warning("TLS handshake with %s failed: %s", extra["peername"], e)
+        yield IOWriteDone(s)
+        s.close()
+        return
+    yield from client_coro(StreamReader(s, s2), StreamWriter(s2, extra))
+
+
+def _serve_conn(coro, server):
+    # Wrapper tracking number of live connections for start_server()
+    try:
+        yield from coro
+    finally:
+        server[0] -= 1
+        t = server[1]
+        if t:
+            # Server task is paused at connection limit, resume it
+            server[1] = None
+            resume(t)
+
+
+def start_server(client_coro, host, port, backlog=10, max_conns=0, reuseport=False, ssl=None):
+    # ssl is a dict of ussl.wrap_socket() params (key, cert, etc.), to
+    # accept TLS connections.
+    # If max_conns is set, new connections aren't accepted (and queue
+    # up in the listen backlog) while there're that many live ones.
+    # reuseport sets SO_REUSEPORT, to let several processes listen on
+    # the same port, see prefork().
     if DEBUG and __debug__:
         log.debug("start_server(%s, %s)", host, port)
     ai = _socket.getaddrinfo(host, port, 0, _socket.SOCK_STREAM)
@@ -238,20 +1070,108 @@ def start_server(client_coro, host, port, backlog=10):
     s.setblocking(False)
 
     s.setsockopt(_socket.SOL_SOCKET, _socket.SO_REUSEADDR, 1)
+    if reuseport:
+        # Not defined by all ports, value is for Linux
+        s.setsockopt(_socket.SOL_SOCKET, getattr(_socket, "SO_REUSEPORT", 15), 1)
     s.bind(ai[-1])
     s.listen(backlog)
-    while True:
-        if DEBUG and __debug__:
-            log.debug("start_server: Before accept")
-        yield IORead(s)
-        if DEBUG and __debug__:
-            log.debug("start_server: After iowait")
-        s2, client_addr = s.accept()
-        s2.setblocking(False)
-        if DEBUG and __debug__:
-            log.debug("start_server: After accept: %s", s2)
-        extra = {"peername": client_addr}
-        yield client_coro(StreamReader(s2), StreamWriter(s2, extra))
+    yield from _serve(s, client_coro, max_conns, ssl)
+
+
+def start_unix_server(client_coro, path, backlog=10, max_conns=0):
+    # Like start_server(), but listening on unix domain socket path (a
+    # stale socket file at path is removed, but any other file there is
+    # an error). Unix port only.
+    if DEBUG and __debug__:
+        log.debug("start_unix_server(%s)", path)
+    import uos
+    try:
+        mode = uos.stat(path)[0]
+    except OSError:
+        mode = None
+    if mode is not None:
+        # S_IFMT, S_IFSOCK
+        if mode & 0o170000 != 0o140000:
+            raise OSError(uerrno.EEXIST)
+        uos.remove(path)
+    s = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    s.setblocking(False)
+    s.bind(_unix_addr(path))
+    s.listen(backlog)
+    yield from _serve(s, client_coro, max_conns, None)
+
+
+def _serve(s, client_coro, max_conns, ssl):
+    # Accept loop of start_server()/start_unix_server() on listening
+    # socket s. If the server task is cancelled, s is closed.
+    loop = get_event_loop()
+    # [number of live connections, paused server task]
+    server = [0, None]
+    try:
+        while True:
+            if max_conns and server[0] >= max_conns:
+                if DEBUG and __debug__:
+                    log.debug("start_server: Connection limit reached")
+                task = loop.cur_task
+                server[1] = task
+                try:
+                    yield from suspend()
+                except:
+                    server[1] = None
+                    raise
+                continue
+            if DEBUG and __debug__:
+                log.debug("start_server: Before accept")
+            yield IORead(s)
+            if DEBUG and __debug__:
+                log.debug("start_server: After iowait")
+            # Accept all pending connections at once, instead of one per
+            # loop iteration. Unless runq grows, stop when it's half full,
+            # leaving the rest to other tasks; remaining connections keep
+            # the socket readable and are accepted on the next wakeup.
+            while loop.runq_grow or len(loop.runq) < loop.runq_len // 2:
+                try:
+                    s2, client_addr = s.accept()
+                except OSError as e:
+                    if e.args[0] == uerrno.EAGAIN:
+                        break
+                    if e.args[0] == uerrno.ECONNABORTED:
+                        continue
+                    raise
+                s2.setblocking(False)
+                if DEBUG and __debug__:
+                    log.debug("start_server: After accept: %s", s2)
+                extra = {"peername": client_addr}
+                if ssl:
+                    coro = _tls_conn(client_coro, s2, extra, ssl)
+                else:
+                    coro = client_coro(StreamReader(s2), StreamWriter(s2, extra))
+                if max_conns:
+                    server[0] += 1
+                    loop.call_soon(_serve_conn(coro, server))
+                    if server[0] >= max_conns:
+                        break
+                else:
+                    loop.call_soon(coro)
+    except CancelledError:
+        yield IOReadDone(s)
+        s.close()
+        raise
+
+
+def prefork(workers):
+    # Fork workers - 1 child processes (unix only), to run a server in
+    # each of them with start_server(..., reuseport=True), so the kernel
+    # distributes connections among processes. Returns worker number,
+    # 0 for the parent process. Should be called before any I/O is
+    # scheduled; each worker gets its own event loop.
+    import os
+    import uasyncio.core
+    for i in range(1, workers):
+        if os.fork() == 0:
+            uasyncio.core._event_loop = None
+            return i
+    return 0
 
 
 import uasyncio.core
@@ -20,12 +20,12 @@ def skip_fqdn(buf):
         buf.read(sz)
 
 
-def make_req(buf, fqdn, is_ipv6):
+def make_req(buf, fqdn, is_ipv6, qid=0):
     typ = 1  # A
     if is_ipv6:
         typ = 28  # AAAA
 
-    buf.writebin(">H", 0)
+    buf.writebin(">H", qid)
     buf.writebin(">H", 0x100)
     # q count
     buf.writebin(">H", 1)
@@ -76,3 +76,40 @@ def parse_resp(buf, is_ipv6):
 
         if t == typ:
             return rval
+
+
+def parse_answers(buf, is_ipv6):
+    # Unlike parse_resp(), returns all addresses of the requested type,
+    # together with their TTLs (in seconds), as well as query id and
+    # response code (0 - no error, 3 - name doesn't exist, etc.):
+    # (id, rcode, [(addr, ttl), ...])
+    typ = 1  # A
+    if is_ipv6:
+        typ = 28  # AAAA
+
+    qid = buf.readbin(">H")
+    flags = buf.readbin(">H")
+    if not flags & 0x8000:
+        raise ValueError("not a response")
+    qcnt = buf.readbin(">H")
+    acnt = buf.readbin(">H")
+    # nscnt, addcnt
+    buf.readbin(">I")
+
+    for i in range(qcnt):
+        skip_fqdn(buf)
+        # Type, class
+        buf.readbin(">I")
+
+    res = []
+    for i in range(acnt):
+        skip_fqdn(buf)
+        t = buf.readbin(">H")
+        buf.readbin(">H")
+        ttl = buf.readbin(">I")
+        rlen = buf.readbin(">H")
+        rval = buf.read(rlen)
+        # Skip CNAMEs, etc.
+        if t == typ:
+            res.append((rval, ttl))
+    return qid, flags & 0xf, res